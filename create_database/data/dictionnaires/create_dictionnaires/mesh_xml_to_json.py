@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
+# Usage (depuis la racine du dépôt) :
+#   python -m create_database.data.dictionnaires.create_dictionnaires.mesh_xml_to_json
 import xml.etree.ElementTree as ET, json
 from pathlib import Path
 
+from create_database.src.mesh_dict_bin import write_mesh_dict_bin
+from create_database.src.utils import fold_term
+
 INPUT_FILE  = Path("fredesc2023.xml")     # ← vérifiez le nom exact
 OUTPUT_FILE = "create_database/data/dictionnaires/mesh_dict.json"
+BINARY_FILE = "create_database/data/dictionnaires/mesh_dict.bin"   # cf. utils.load_mesh_dict
 
 mesh_terms, seen = [], set()
 
@@ -48,3 +54,7 @@ with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
     json.dump(mesh_terms, f, ensure_ascii=False, indent=2)
 
 print(f"✅ {len(mesh_terms)} entries written to {OUTPUT_FILE}")
+
+# ---------- format binaire compact (mmap) ------------------------------------
+write_mesh_dict_bin(mesh_terms, BINARY_FILE, OUTPUT_FILE, fold_term)
+print(f"✅ {BINARY_FILE} written")
@@ -6,9 +6,11 @@ depuis PubMed (eUtils) → nouvelle colonne "pubmed_mesh".
 """
 
 from datasets import load_from_disk, Features, Sequence, Value
-import os, time, requests, xml.etree.ElementTree as ET
+import os, time, requests
 from tqdm import tqdm
 
+from create_database.src.pubmed.fetch_mesh import iter_mesh_headings
+
 LOCAL_DS_DIR = "create_database/data/local_databases/edu3-clinical-fr+mesh"
 BATCH_SIZE   = 100          # nb de PMIDs par appel EFetch (max = 200)
 API_KEY      = os.getenv("NCBI_API_KEY")  # facultatif, ↑ quota à 10 req/s
@@ -35,23 +37,21 @@ def fetch_mesh_for_pmids(pmids):
         url += f"&api_key={API_KEY}"
 
     for _try in range(3):              # petit retry 3×
-        resp = requests.get(url, timeout=15)
+        resp = requests.get(url, timeout=15, stream=True)
         if resp.status_code == 200:
             break
+        resp.close()
         time.sleep(1.5)
     else:
         # échec → liste vide pour tous
         return {pid: [] for pid in pmids}
 
+    # lecture en flux : seuls PMID et DescriptorName/@UI sont extraits
     out = {}
-    root = ET.fromstring(resp.text)
-    for art in root.findall(".//PubmedArticle"):
-        pmid = art.findtext(".//MedlineCitation/PMID").strip()
-        mesh_codes = [
-            mh.get("UI") for mh in art.findall(".//MeshHeadingList/MeshHeading/DescriptorName")
-            if mh is not None and mh.get("UI")
-        ]
-        out[pmid] = sorted(set(mesh_codes))
+    with resp:
+        resp.raw.decode_content = True
+        for pmid, mesh_codes in iter_mesh_headings(resp.raw):
+            out[pmid] = sorted({ui for ui in mesh_codes if ui})
 
     # pmids non revenus (embargo, rétractation, etc.)
     for pid in pmids:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# TEST_fast_path_equivalence.py
+"""
+Usage
+-----
+    python TEST_fast_path_equivalence.py [NB_DOCS] [MRCONSO.RRF]
+
+Vérifie, sur l'échantillon local edu3-clinical-fr+mesh, que la voie
+rapide (`--fast`, `FastDocPipeline.run_columns`) produit exactement les
+mêmes colonnes que le pipeline Medkit suivi de `cli.doc_to_columns`.
+Chaque voie a ses propres opérations, sans cache GLiNER ni mémo persistant
+(`gliner_cache=False, norm_memo=False`) : la voie rapide ne rejoue pas les
+résultats de la voie Medkit.  Les colonnes comparées sont celles du premier
+passage ; le second, chronométré, part pour les deux voies de caches chauds.
+UMLS via UMLS_API_KEY, ou hors-ligne si un MRCONSO.RRF est fourni.
+Code de sortie 1 si un document diffère.
+"""
+
+import json, sys, time
+from datasets import load_from_disk
+from dotenv import load_dotenv
+
+from create_database.src.cli import _annotate
+from create_database.src.pipeline.build_pipeline import get_doc_pipeline
+
+LOCAL_DS_DIR = "create_database/data/local_databases/edu3-clinical-fr+mesh"
+NB_DOCS      = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+MRCONSO      = sys.argv[2] if len(sys.argv) > 2 else None
+BATCH_SIZE   = 8
+
+load_dotenv()
+ds = load_from_disk(LOCAL_DS_DIR)
+ds = ds.select(range(min(NB_DOCS, len(ds))))
+print(f"{len(ds)} documents")
+
+options = dict(umls_api_key=None, device="cpu", batch_size=BATCH_SIZE,
+               norm_memo=False, gliner_cache=False, mrconso=MRCONSO)
+medkit_pipe = get_doc_pipeline(**options)
+fast_pipe = get_doc_pipeline(**options, fast=True)
+
+
+def run(doc_pipe):
+    rows, elapsed = [], 0.0
+    for batch in ds.iter(batch_size=BATCH_SIZE):
+        todo = list(range(len(batch["article_id"])))
+        t0 = time.perf_counter()
+        rows += _annotate(doc_pipe, batch, todo)
+        elapsed += time.perf_counter() - t0
+    return rows, elapsed
+
+
+# 1er passage à froid : colonnes comparées ; 2e passage (caches chauds) : chrono
+medkit_rows, _ = run(medkit_pipe)
+fast_rows, _ = run(fast_pipe)
+_, medkit_s = run(medkit_pipe)
+_, fast_s = run(fast_pipe)
+
+diff = [
+    (article_id, col)
+    for article_id, a, b in zip(ds["article_id"], medkit_rows, fast_rows)
+    for col in a.keys() | b.keys()
+    if json.dumps(a.get(col), sort_keys=True) != json.dumps(b.get(col), sort_keys=True)
+]
+print(f"pipeline Medkit : {medkit_s:6.2f} s")
+print(f"voie rapide     : {fast_s:6.2f} s   (× {medkit_s / fast_s:.2f})")
+print(f"colonnes identiques : {not diff} ({len(medkit_rows)} documents)")
+for article_id, col in diff[:20]:
+    print(f"  ✗ {article_id} : {col}")
+medkit_pipe.close()
+fast_pipe.close()
+sys.exit(1 if diff else 0)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# TEST_umls_offline_resolver.py
+"""
+Usage
+-----
+    python -m create_database.dvpt_scripts.other.TEST_umls_offline_resolver
+
+Vérifie `OfflineUMLSResolver` sur un petit MRCONSO.RRF
+(`fixtures/MRCONSO_sample.RRF`, sans réseau ni licence UMLS) :
+    • codes attendus pour chaque UI MeSH, au format [(code, cui)] ;
+    • lignes ICD10CM supprimées (SUPPRESS O / Y / E) écartées ;
+    • résolveur : CUI dans l'ordre de première apparition, doublons ignorés ;
+    • `ICD10Mapper` : CUI triés, un code porté par plusieurs CUI garde le
+      plus petit, quel que soit l'ordre rendu par la source ;
+    • même sortie (et mêmes entrées de cache) que la voie REST d'`ICD10Mapper`,
+      dont les réponses UTS sont simulées à partir du même fichier, CUI
+      rendus dans l'ordre inverse (l'ordre de recherche UTS n'est pas celui
+      du MRCONSO.RRF).
+Code de sortie 1 si une vérification échoue.
+"""
+
+import pathlib, sys, tempfile
+
+from create_database.src.pipeline.icd10_mapper import ICD10Mapper
+from create_database.src.pipeline.umls_offline import OfflineUMLSResolver, mrconso_source_key
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "MRCONSO_sample.RRF"
+
+EXPECTED = {
+    "D000001": [("J45.9", "C0000001"), ("J45.909", "C0000001"), ("K21.9", "C0000002")],
+    "D000002": [],            # seuls codes ICD-10 supprimés
+    "D000003": [],            # CUI sans code ICD-10
+    "D000404": [],            # UI absent du MRCONSO
+}
+EXPECTED_CUIS = {"D000001": ["C0000002", "C0000001"], "D000002": ["C0000003"],
+                 "D000003": ["C0000004"], "D000404": []}
+
+
+class MemoryCache:
+    def __init__(self): self._data = {}
+    def load_all(self): return dict(self._data)
+    def get(self, ui): return self._data.get(ui)
+    def put(self, ui, entry): self._data[ui] = entry
+    def flush(self): pass
+    def close(self): pass
+
+
+class FakeRestMapper(ICD10Mapper):
+    """Voie REST d'`ICD10Mapper`, réponses UTS construites depuis le fixture."""
+
+    def __init__(self, rows, **kwargs):
+        super().__init__(api_key="fixture", cache=MemoryCache(), **kwargs)
+        self._rows = rows
+
+    def _get_json(self, url):
+        if "/source/MSH/" in url:                   # UI ➜ lien vers les concepts
+            ui = url.split("/source/MSH/")[1].split("?")[0]
+            if not any(r[11] == "MSH" and r[13] == ui for r in self._rows):
+                return {"error": "Not found"}
+            return {"result": {"concepts": f"{self._BASE}/search/current?string={ui}"}}
+        if "/search/" in url:                       # concepts, autre ordre que le fichier
+            ui = url.split("string=")[1].split("&")[0]
+            cuis = list(dict.fromkeys(r[0] for r in self._rows
+                                      if r[11] == "MSH" and r[13] == ui))[::-1]
+            return {"result": {"results": [{"ui": cui} for cui in cuis]}}
+        cui = url.split("/CUI/")[1].split("/")[0]   # atomes ICD10CM non supprimés
+        return {"result": [
+            {"code": f"{self._BASE}/content/2025AA/source/ICD10CM/{r[13]}",
+             "rootSource": "ICD10CM"}
+            for r in self._rows
+            if r[0] == cui and r[11] == "ICD10CM" and r[16] == "N"
+        ]}
+
+
+rows = [line.rstrip("\n").split("|") for line in FIXTURE.open(encoding="utf-8")]
+failures = []
+
+
+def check(name, got, want):
+    print(f"  {'✓' if got == want else '✗'} {name}")
+    if got != want:
+        failures.append(name)
+        print(f"      obtenu  : {got}\n      attendu : {want}")
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    resolver = OfflineUMLSResolver(index_path=pathlib.Path(tmp) / "index.sqlite",
+                                   mrconso=FIXTURE)
+    check("espace de noms du cache = identité du MRCONSO",
+          resolver.source_key, mrconso_source_key(FIXTURE))
+    offline = ICD10Mapper(resolver=resolver, cache=MemoryCache())
+    rest = FakeRestMapper(rows)
+
+    print("hors-ligne (MRCONSO) :")
+    for ui, want in EXPECTED.items():
+        check(f"{ui} CUI", resolver.mesh_ui_to_cuis(ui), EXPECTED_CUIS[ui])
+        check(f"{ui} codes", offline.codes(ui), want)
+
+    print("REST (UTS simulé) ≡ hors-ligne :")
+    for ui in EXPECTED:
+        check(f"{ui} codes", rest.codes(ui), offline.codes(ui))
+        check(f"{ui} entrée de cache", rest._cache.get(ui), offline._cache.get(ui))
+
+print(f"{len(failures)} échec(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# bench_gliner_engines.py
+"""
+Usage
+-----
+    python bench_gliner_engines.py [NB_DOCS] [NUM_THREADS]
+
+Compare, sur l'échantillon local edu3-clinical-fr+mesh :
+    • le débit (docs/s) du moteur PyTorch CPU et du moteur ONNX int8 ;
+    • l'accord des entités (précision / rappel / F1 de l'ONNX par rapport
+      à PyTorch, sur les triplets (start, end, label)).
+"""
+
+import sys, time
+from datasets import load_from_disk
+from medkit.core.text import TextDocument
+
+from create_database.src.pipeline.gliner_detector import GlinerDetector
+
+LOCAL_DS_DIR = "create_database/data/local_databases/edu3-clinical-fr+mesh"
+LABELS       = ["disease", "condition", "symptom", "treatment"]
+NB_DOCS      = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+NUM_THREADS  = int(sys.argv[2]) if len(sys.argv) > 2 else None
+BATCH_SIZE   = 8
+
+# ------------------------------------------------------------------ #
+# 1. Échantillon de textes
+# ------------------------------------------------------------------ #
+ds = load_from_disk(LOCAL_DS_DIR)
+texts = ds.select(range(min(NB_DOCS, len(ds))))["article_text"]
+print(f"{len(texts)} documents, {sum(map(len, texts))} caractères")
+
+
+def run_engine(engine: str):
+    det = GlinerDetector(labels=LABELS, device="cpu", engine=engine,
+                         num_threads=NUM_THREADS, batch_size=BATCH_SIZE)
+    segments = [TextDocument(text=t).raw_segment for t in texts]
+    for seg in segments:
+        seg.metadata["doc_id"] = seg.uid
+
+    # premier lot hors chrono (initialisation des sessions / kernels)
+    det.run(segments[:1])
+
+    t0 = time.perf_counter()
+    preds = {seg.uid: set() for seg in segments}
+    for i in range(0, len(segments), BATCH_SIZE):
+        for ent in det.run(segments[i:i + BATCH_SIZE]):
+            span = ent.spans[0]
+            label = ent.attrs.get(label="gliner_label")[0].value
+            preds[ent.metadata["doc_id"]].add((span.start, span.end, label))
+    elapsed = time.perf_counter() - t0
+    return [preds[seg.uid] for seg in segments], elapsed
+
+
+# ------------------------------------------------------------------ #
+# 2. Mesures
+# ------------------------------------------------------------------ #
+results = {}
+for engine in ("torch", "onnx"):
+    preds, elapsed = run_engine(engine)
+    results[engine] = preds
+    n_ents = sum(map(len, preds))
+    print(f"[{engine:5}] {elapsed:7.1f} s  |  {len(texts)/elapsed:6.2f} docs/s"
+          f"  |  {n_ents} entités")
+
+ref, new = results["torch"], results["onnx"]
+tp = sum(len(r & n) for r, n in zip(ref, new))
+n_ref, n_new = sum(map(len, ref)), sum(map(len, new))
+precision = tp / n_new if n_new else 1.0
+recall    = tp / n_ref if n_ref else 1.0
+f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+print("\n===== ACCORD ONNX int8 vs PyTorch =====")
+print(f"précision : {precision:.3f}")
+print(f"rappel    : {recall:.3f}")
+print(f"F1        : {f1:.3f}")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# bench_gliner_label_embeds.py
+"""
+Usage
+-----
+    python bench_gliner_label_embeds.py [NB_DOCS] [MODELE] [NUM_THREADS]
+
+Latence GLiNER par document sur CPU, sur l'échantillon local
+edu3-clinical-fr+mesh, avec et sans réutilisation des embeddings des
+labels (encodés une fois au chargement, cf. `GlinerDetector._encode_labels`).
+
+Le pré-encodage n'existe que pour les modèles bi-encodeur (encodeur de
+labels séparé, ex. knowledgator/gliner-bi-base-v2.0).  Pour un
+uni-encodeur comme le modèle par défaut, les labels font partie du prompt :
+rien n'est à réutiliser, le script le signale et s'arrête sans mesurer.
+"""
+
+import statistics, sys, time
+from datasets import load_from_disk
+
+from create_database.src.pipeline.gliner_detector import GlinerDetector
+from create_database.src.pipeline.gliner_engine import DEFAULT_MODEL
+
+LOCAL_DS_DIR = "create_database/data/local_databases/edu3-clinical-fr+mesh"
+LABELS       = ["disease", "condition", "symptom", "treatment"]
+NB_DOCS      = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+MODEL        = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL
+NUM_THREADS  = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+ds = load_from_disk(LOCAL_DS_DIR)
+texts = ds.select(range(min(NB_DOCS, len(ds))))["article_text"]
+print(f"{len(texts)} documents, modèle {MODEL}")
+
+
+def detector(precompute: bool) -> GlinerDetector:
+    det = GlinerDetector(labels=LABELS, device="cpu", model_name=MODEL,
+                         num_threads=NUM_THREADS, precompute_labels=precompute)
+    det.predict(texts[:1])                  # chargement + chauffe hors chrono
+    return det
+
+
+with_embeds = detector(precompute=True)
+if with_embeds._labels_embeddings is None:
+    print("pas d'encodeur de labels (uni-encodeur) : rien à réutiliser")
+    sys.exit(0)
+
+
+def run(det: GlinerDetector):
+    latencies, preds = [], []
+    for text in texts:                      # un document à la fois
+        t0 = time.perf_counter()
+        ents = det.predict([text])[0]
+        latencies.append(1000 * (time.perf_counter() - t0))
+        preds.append({(e["start"], e["end"], e["label"]) for e in ents})
+    return latencies, preds
+
+
+results = {}
+for precompute in (False, True):
+    latencies, preds = run(with_embeds if precompute else detector(precompute=False))
+    results[precompute] = preds
+    q = statistics.quantiles(latencies, n=20)
+    name = "labels pré-encodés" if precompute else "labels à chaque lot"
+    print(f"[{name:20}] moyenne {statistics.mean(latencies):7.1f} ms"
+          f" | médiane {statistics.median(latencies):7.1f} ms | p95 {q[18]:7.1f} ms")
+
+same = sum(a == b for a, b in zip(results[False], results[True]))
+print(f"entités identiques : {same} / {len(texts)} documents")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# bench_icd10_attach.py
+"""
+Usage
+-----
+    python bench_icd10_attach.py [NB_DOCS] [NB_ENTITES_PAR_DOC]
+
+Micro-benchmark de l'attachement des attributs ICD-10 par
+`ICD10Mapper._run_doc`, sur des documents synthétiques très denses en
+entités (aucun appel réseau : résolveur et cache en mémoire) :
+    • version actuelle (index MeSH ID ➜ annotations construit une fois) ;
+    • ancienne version (re-parcours de toutes les annotations par code).
+Vérifie aussi que les deux versions attachent exactement les mêmes attributs.
+"""
+
+import json, random, sys, time
+
+from medkit.core.attribute import Attribute
+from medkit.core.text import EntityNormAttribute, Segment, Span
+
+from create_database.src.pipeline.icd10_mapper import ICD10Mapper
+
+NB_DOCS    = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+NB_ENTITES = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+NB_MESH    = 300            # vocabulaire MeSH synthétique
+random.seed(0)
+
+
+# ------------------------------------------------------------------ #
+# 1. Résolveur / cache factices
+# ------------------------------------------------------------------ #
+class FakeResolver:
+    """MeSH Dxxxxxx ➜ 1 CUI ➜ 0 à 3 codes ICD-10 (déterministe)."""
+
+    def mesh_ui_to_cuis(self, ui):
+        return [f"C{ui[1:]}"]
+
+    def cui_to_icd10cm(self, cui):
+        n = int(cui[1:]) % 4
+        return [f"X{cui[-3:]}.{k}" for k in range(n)]
+
+
+class MemoryCache:
+    def __init__(self): self._data = {}
+    def load_all(self): return dict(self._data)
+    def get(self, ui): return self._data.get(ui)
+    def put(self, ui, entry): self._data[ui] = entry
+    def flush(self): pass
+    def close(self): pass
+
+
+class LegacyICD10Mapper(ICD10Mapper):
+    """Attachement d'origine : re-parcours de toutes les annotations par attribut."""
+
+    def _run_doc(self, mesh_segments, pubmed_segments):
+        prov_map = {}
+        for seg in mesh_segments:
+            for norm in seg.attrs.get(label="NORMALIZATION"):
+                if norm.kb_name == "MeSH":
+                    prov_map.setdefault(norm.kb_id, set()).add("gliner")
+        for seg in pubmed_segments:
+            for norm in seg.attrs.get(label="NORMALIZATION"):
+                if norm.kb_name == "MeSH":
+                    prov_map.setdefault(norm.kb_id, set()).add("pubmed")
+
+        trace = {}
+        for attr in self.map_mesh_ids(list(prov_map)):
+            mid = attr.metadata["mesh_id"]
+            provenance = prov_map[mid]
+            attr.metadata["provenance"] = (
+                "both" if len(provenance) == 2 else next(iter(provenance))
+            )
+            trace.setdefault(attr.value, {"cui": attr.metadata["cui"], "mesh_id": mid,
+                                          "provenance": attr.metadata["provenance"]})
+            for ann in mesh_segments + pubmed_segments:
+                for norm in ann.attrs.get(label="NORMALIZATION"):
+                    if norm.kb_name == "MeSH" and norm.kb_id == mid:
+                        ann.attrs.add(attr.copy())
+                        break
+
+        if mesh_segments or pubmed_segments:
+            ann = (mesh_segments or pubmed_segments)[0]
+            ann.attrs.add(Attribute(label="icd10_trace",
+                                    value=json.dumps(trace, ensure_ascii=False)))
+
+
+# ------------------------------------------------------------------ #
+# 2. Documents synthétiques
+# ------------------------------------------------------------------ #
+def make_doc():
+    mesh, pubmed = [], []
+    for i in range(NB_ENTITES):
+        seg = Segment(label="medical_entity", spans=[Span(i, i + 1)], text="x")
+        for _ in range(random.randint(1, 2)):
+            seg.attrs.add(EntityNormAttribute(kb_name="MeSH", kb_id=f"D{random.randrange(NB_MESH):06d}",
+                                              kb_version=None, term=None, score=1.0))
+        mesh.append(seg)
+    for _ in range(15):
+        seg = Segment(label="medical_entity", spans=[Span(0, 0)], text="")
+        seg.attrs.add(EntityNormAttribute(kb_name="MeSH", kb_id=f"D{random.randrange(NB_MESH):06d}"))
+        pubmed.append(seg)
+    return mesh, pubmed
+
+
+def icd_view(docs):
+    return [
+        [[(a.label, a.value, json.dumps(a.metadata, sort_keys=True)) for a in seg.attrs
+          if a.label in ("ICD10CM", "icd10_trace")] for seg in mesh + pubmed]
+        for mesh, pubmed in docs
+    ]
+
+
+def run(mapper_cls):
+    mapper = mapper_cls(cache=MemoryCache(), resolver=FakeResolver())
+    mapper.prefetch(f"D{i:06d}" for i in range(NB_MESH))      # hors chrono
+    random.seed(1)
+    docs = [make_doc() for _ in range(NB_DOCS)]
+    t0 = time.perf_counter()
+    for mesh, pubmed in docs:
+        mapper._run_doc(mesh, pubmed)
+    return time.perf_counter() - t0, icd_view(docs)
+
+
+# ------------------------------------------------------------------ #
+# 3. Mesures
+# ------------------------------------------------------------------ #
+legacy_s, legacy_out = run(LegacyICD10Mapper)
+index_s, index_out = run(ICD10Mapper)
+
+print(f"{NB_DOCS} documents × {NB_ENTITES} entités")
+print(f"ancien attachement : {1000 * legacy_s / NB_DOCS:8.2f} ms / doc")
+print(f"index MeSH ID      : {1000 * index_s / NB_DOCS:8.2f} ms / doc"
+      f"   (× {legacy_s / index_s:.1f})")
+print("attributs identiques :", legacy_out == index_out)
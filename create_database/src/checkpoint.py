@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# create_database/src/checkpoint.py
+# ──────────────────────────────────────────────────────────────
+"""Points de reprise d'un build, document par document.
+
+Chaque document traité est enregistré avec ses colonnes calculées sous la
+clé `article_id:empreinte`, l'empreinte étant un sha256 du texte et de la
+configuration du pipeline (cf. `build_pipeline.pipeline_config_key`) : un
+texte modifié ou une autre configuration donnent une nouvelle clé, donc un
+nouveau calcul.
+
+Une base SQLite (mode WAL, comme `icd10_cache`) par configuration :
+
+    <dossier>/<config_key>/checkpoint.sqlite
+        rows(key TEXT PRIMARY KEY, row TEXT)   colonnes du document (JSON)
+
+Les lignes sont lues à la demande et les ajouts écrits par transactions
+groupées : la mémoire d'un processus ne dépend pas de la taille du corpus,
+et plusieurs processus workers partagent la même base.  Après un crash,
+seules les lignes du dernier paquet non écrit sont perdues.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+
+from .metrics import get_metrics
+
+DEFAULT_CHECKPOINT_DIR = pathlib.Path("create_database/data/checkpoints")
+
+
+class BuildCheckpoint:
+    """
+    Parameters
+    ----------
+    directory : Path or str
+        Dossier racine des points de reprise (un sous-dossier par configuration).
+    config_key : str
+        Empreinte de la configuration du pipeline.
+    flush_every : int
+        Nombre de documents regroupés dans une même transaction.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path | str = DEFAULT_CHECKPOINT_DIR,
+        config_key: str = "",
+        flush_every: int = 100,
+    ):
+        self.directory = pathlib.Path(directory) / (config_key or "default")
+        self.config_key = config_key
+        self.flush_every = flush_every
+        self.reused = 0
+        self._pending: dict[str, dict] = {}
+        # une connexion par instance, protégée par un verrou (mode --pipelined :
+        # lecture dans le thread d'alimentation, écriture dans le principal)
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.directory / "checkpoint.sqlite"), timeout=60, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row TEXT NOT NULL)"
+            )
+
+    def key(self, article_id, text: str) -> str:
+        digest = hashlib.sha256(f"{self.config_key}\0{text}".encode("utf-8")).hexdigest()
+        return f"{article_id}:{digest[:16]}"
+
+    # ---------------- lecture ----------------
+    def __len__(self) -> int:
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()
+            return n + len(self._pending)
+
+    def get(self, article_id, text: str) -> dict | None:
+        """Colonnes déjà calculées pour ce document, ou None."""
+        key = self.key(article_id, text)
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                found = self._conn.execute(
+                    "SELECT row FROM rows WHERE key = ?", (key,)
+                ).fetchone()
+                row = json.loads(found[0]) if found else None
+        if row is not None:
+            self.reused += 1
+        get_metrics().inc("cache_lookups_total", cache="checkpoint",
+                          result="miss" if row is None else "hit")
+        return row
+
+    # ---------------- écriture ----------------
+    def add(self, article_id, text: str, row: dict) -> None:
+        with self._lock:
+            self._pending[self.key(article_id, text)] = row
+            if len(self._pending) >= self.flush_every:
+                self._commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (key, row) VALUES (?, ?)",
+                ((key, json.dumps(row, ensure_ascii=False))
+                 for key, row in self._pending.items()),
+            )
+        self._pending.clear()
+
+
+__all__ = ["BuildCheckpoint", "DEFAULT_CHECKPOINT_DIR"]
@@ -5,17 +5,362 @@
 import argparse
 import os
 import json
+import pathlib
 import typer
+import pyarrow as pa
 from dotenv import load_dotenv
+from tqdm import tqdm
 from datasets import load_dataset, Features, Sequence, Value
 from huggingface_hub import HfApi
 from medkit.core.text import TextDocument
 
 # pipeline complet (GLiNER ▸ MeSH ▸ PubMed ▸ ICD-10-CM)
-from create_database.src.pipeline.build_pipeline import get_doc_pipeline
+from create_database.src.pipeline.build_pipeline import (
+    BatchDocPipeline, PipelineOperations, get_doc_pipeline, pipeline_config_key,
+)
+from create_database.src.pipeline.fast_path import FastDocPipeline
+from create_database.src.pipeline.icd10_mapper import CHECKTAGS_PATH
+from create_database.src.checkpoint import BuildCheckpoint, DEFAULT_CHECKPOINT_DIR
+from create_database.src.publish import HubTarget, LocalTarget, ParquetShardWriter, publish
 
 from create_database.src.pubmed.fetch_mesh import mapping as pmid2mesh  
-from create_database.src.pubmed.fetch_mesh import fetch_batch
+from create_database.src.pubmed.fetch_mesh import prefetch as prefetch_pubmed
+from create_database.src.http_client import get_client
+from create_database.src.metrics import (
+    DEFAULT_METRICS_DIR,
+    clear_worker_reports,
+    run_report,
+    write_run_report,
+)
+
+# ──────────────────────────────────────────────────────────────
+# annotations Medkit ➜ colonnes du dataset (un document)
+# ──────────────────────────────────────────────────────────────
+def doc_to_columns(doc: TextDocument, mesh_exclusions: frozenset[str] = frozenset()) -> dict:
+    """
+    Convertit les annotations produites par le pipeline sur `doc`
+    en valeurs des colonnes ajoutées au dataset (`mesh_exclusions` :
+    MeSH écartés du mapping ICD-10, cf. `PipelineOperations.mesh_exclusions`).
+    """
+    # ---------- ICD-10 trace (inchangé) ----------
+    trace = {}
+    for seg in doc.anns:
+        for icd_attr in seg.attrs.get(label="ICD10CM"):
+            code = icd_attr.value
+            meta = trace.setdefault(
+                code,
+                {
+                    "cui":        icd_attr.metadata["cui"],
+                    "mesh_id":    icd_attr.metadata["mesh_id"],
+                    "provenance": set(),
+                },
+            )
+            meta["provenance"].add(icd_attr.metadata["provenance"])
+
+    for meta in trace.values():
+        p = meta["provenance"]
+        meta["provenance"] = "both" if len(p) == 2 else next(iter(p))
+    cols = {"icd10_trace": json.dumps(trace, ensure_ascii=False)}
+
+    # ---------- parcourir les segments ----------
+    gliner_mesh   = set()
+    pubmed_mesh   = set()
+    icd_codes     = set()
+    detected      = []
+
+    for seg in doc.anns:
+        if seg.label != "medical_entity":
+            continue
+
+        if "mesh_norm" in seg.keys:       # ⇦ segments GLiNER uniquement
+            # -- GLiNER label
+            gl_label_attr = seg.attrs.get(label="gliner_label")
+            gl_label = gl_label_attr[0].value if gl_label_attr else None
+
+            # -- MeSH
+            mesh_ids = [n.kb_id for n in seg.attrs.get(label="NORMALIZATION")
+                        if n.kb_name == "MeSH"]
+            mesh_id  = mesh_ids[0] if mesh_ids else None
+
+            detected.append(
+                {"term": seg.text, "label": gl_label, "mesh_id": mesh_id}
+            )
+            if mesh_id:
+                gliner_mesh.add(mesh_id)
+
+        elif "pubmed_mesh" in seg.keys:
+            # MeSH provenant de PubMed (pas ajouté à detected_entities)
+            for norm in seg.attrs.get(label="NORMALIZATION"):
+                if norm.kb_name == "MeSH":
+                    pubmed_mesh.add(norm.kb_id)
+
+        # -- ICD-10
+        for icd_attr in seg.attrs.get(label="ICD10CM"):
+            icd_codes.add(icd_attr.value)
+    # ---------- version réduite des codes CIM-10 ----------
+    codes_reduct = {code.split(".")[0] for code in icd_codes}
+
+    # ---------- colonnes dataset ----------
+    cols["detected_entities"] = detected
+    cols["mesh_from_gliner"]  = sorted(gliner_mesh)
+    cols["pubmed_mesh"]       = sorted(pubmed_mesh)
+    cols["union_mesh"]        = sorted(gliner_mesh | pubmed_mesh)
+    cols["inter_mesh"]        = sorted(gliner_mesh & pubmed_mesh)
+    cols["mesh_clean"]        = sorted((gliner_mesh | pubmed_mesh) - mesh_exclusions)
+    cols["icd10_codes"]       = sorted(icd_codes)
+    cols["icd10_codes_reduct"] = sorted(codes_reduct)
+    return cols
+
+
+# types des colonnes ajoutées au dataset
+OUTPUT_FEATURES = {
+    "mesh_from_gliner":  Sequence(Value("string")),
+    "pubmed_mesh":       Sequence(Value("string")),
+    "union_mesh":  Sequence(Value("string")),
+    "inter_mesh":  Sequence(Value("string")),
+    "mesh_clean":  Sequence(Value("string")),
+    "icd10_codes":       Sequence(Value("string")),
+    "icd10_codes_reduct": Sequence(Value("string")),
+    "icd10_trace":     Value("string"),
+}
+DETECTED_ENTITIES_FEATURE = [
+    {"term": Value("string"), "label": Value("string"), "mesh_id": Value("string")}
+]
+
+
+# ──────────────────────────────────────────────────────────────
+# exécution du pipeline (un pipeline par processus, cf. --num-proc)
+# ──────────────────────────────────────────────────────────────
+# pid ➜ pipeline : construit au premier lot traité par le processus, jamais
+# sérialisé vers les workers (seuls les paramètres le sont, via fn_kwargs)
+STREAMING_OUT_DIR = pathlib.Path("create_database/data/streaming_out")
+
+_PROCESS_PIPELINES: dict[int, PipelineOperations] = {}
+_PROCESS_CHECKPOINTS: dict[int, BuildCheckpoint] = {}
+
+
+def _process_pipeline(pipeline_kwargs: dict, http_share: int = 1) -> PipelineOperations:
+    pid = os.getpid()
+    if pid not in _PROCESS_PIPELINES:
+        get_client().set_share(http_share)     # débits UMLS / NCBI répartis
+        _PROCESS_PIPELINES[pid] = get_doc_pipeline(**pipeline_kwargs)
+    return _PROCESS_PIPELINES[pid]
+
+
+def _process_checkpoint(checkpoint_dir: str | None, config_key: str) -> BuildCheckpoint | None:
+    if not checkpoint_dir:
+        return None
+    pid = os.getpid()
+    if pid not in _PROCESS_CHECKPOINTS:
+        _PROCESS_CHECKPOINTS[pid] = BuildCheckpoint(checkpoint_dir, config_key)
+    return _PROCESS_CHECKPOINTS[pid]
+
+
+def _print_stats(doc_pipe: PipelineOperations, prefix: str = "") -> None:
+    # ---------- compteurs des opérations (ex. voies exact / fuzzy) ----------
+    for op_name, counters in doc_pipe.stats().items():
+        total = sum(counters.values()) or 1
+        print(f"{prefix}{op_name} : " + " | ".join(
+            f"{k} {v} ({100 * v / total:.1f} %)" for k, v in counters.items()
+        ))
+    # ---------- client HTTP partagé (UMLS + eUtils) ----------
+    if http_stats := get_client().stats:
+        print(f"{prefix}HTTP : " + " | ".join(
+            f"{k} {v:g}" for k, v in sorted(http_stats.items())
+        ))
+    report = run_report()
+    # ---------- taux de succès des caches, documents sans PMID ----------
+    if caches := report["caches"]:
+        print(f"{prefix}caches : " + " | ".join(
+            f"{name} {c['hits']:g} / {c['hits'] + c['misses']:g}"
+            + (f" ({100 * c['hit_rate']:.1f} %)" if c["hit_rate"] is not None else "")
+            for name, c in caches.items()
+        ))
+    if missing := sum(c["value"] for c in report["counters"]
+                      if c["name"] == "pubmed_missing_pmid_total"):
+        print(f"{prefix}PubMed : {missing:g} documents sans PMID")
+    # ---------- temps par étape (cf. metrics) ----------
+    if stages := report["stages"]:
+        print(f"{prefix}étapes : " + " | ".join(
+            f"{name} {st['seconds']:.1f} s ({100 * st['share']:.0f} %,"
+            f" p95 {1000 * st['latency']['p95']:.0f} ms/lot)"
+            for name, st in stages.items()
+        ))
+
+
+def _write_metrics(doc_pipe: PipelineOperations, metrics_dir: str | None,
+                   worker: int | None = None, prefix: str = "") -> None:
+    """Rapport JSON et fichier Prometheus du processus (cf. `metrics`)."""
+    if not metrics_dir:
+        return
+    json_path, prom_path = write_run_report(
+        metrics_dir, op_stats=doc_pipe.stats(),
+        http_stats=dict(get_client().stats), worker=worker,
+    )
+    print(f"{prefix}mesures : {json_path}, {prom_path}")
+
+
+def _make_docs(batch, todo: list[int]) -> list[TextDocument]:
+    """Documents Medkit des lignes `todo` d'un lot (PMID en métadonnées)."""
+    docs = []
+    for i in todo:
+        text, article_id = batch["article_text"][i], batch["article_id"][i]
+        doc = TextDocument(
+            text=text,
+            metadata={"pmid": str(article_id)}
+        )
+        doc.raw_segment.metadata["pmid"] = str(article_id)
+        docs.append(doc)
+    return docs
+
+
+def _set_columns(batch, rows: list[dict]):
+    for col in rows[0] if rows else ():
+        batch[col] = [row[col] for row in rows]
+    return batch
+
+
+def _split_done(batch, checkpoint: BuildCheckpoint | None):
+    """
+    Lignes déjà calculées d'après le point de reprise (None sinon) et
+    indices des documents restant à traiter.
+    """
+    if checkpoint is None:
+        rows = [None] * len(batch["article_id"])
+    else:
+        rows = [checkpoint.get(a, t)
+                for a, t in zip(batch["article_id"], batch["article_text"])]
+    return rows, [i for i, row in enumerate(rows) if row is None]
+
+
+def _annotate(doc_pipe: BatchDocPipeline | FastDocPipeline, batch, todo: list[int]) -> list[dict]:
+    """
+    Colonnes des documents `todo` du lot : pipeline Medkit puis
+    `doc_to_columns`, ou directement la voie rapide (`--fast`).
+    """
+    if not todo:
+        return []
+    if isinstance(doc_pipe, FastDocPipeline):
+        return doc_pipe.run_columns([batch["article_text"][i] for i in todo],
+                                    [str(batch["article_id"][i]) for i in todo])
+    docs = _make_docs(batch, todo)
+    doc_pipe.run(docs)
+    return [doc_to_columns(doc, doc_pipe.mesh_exclusions) for doc in docs]
+
+
+def _merge_rows(batch, rows, fresh_rows, checkpoint: BuildCheckpoint | None):
+    """Complète `rows` avec les lignes calculées et les enregistre."""
+    fresh = iter(fresh_rows)
+    for i, (article_id, text) in enumerate(zip(batch["article_id"], batch["article_text"])):
+        if rows[i] is None:
+            rows[i] = next(fresh)
+            if checkpoint is not None:
+                checkpoint.add(article_id, text, rows[i])
+    return _set_columns(batch, rows)
+
+
+def medkit_map(batch, indices, pipeline_kwargs, shard_ends=(), http_share=1,
+               checkpoint_dir=None, config_key="", metrics_dir=None):
+    """
+    Fonction de `ds.map` (lots de `batch_size` docs) : annotations Medkit ➜
+    colonnes du dataset.  Les documents présents dans le point de reprise
+    (`checkpoint_dir`) ne sont pas recalculés.  Le processus qui traite le
+    dernier document de son shard (`shard_ends`) vide les caches de son
+    pipeline, affiche ses compteurs et écrit ses mesures (`metrics_dir`).
+    """
+    doc_pipe = _process_pipeline(pipeline_kwargs, http_share)
+    checkpoint = _process_checkpoint(checkpoint_dir, config_key)
+
+    # 1) documents du lot restant à traiter
+    rows, todo = _split_done(batch, checkpoint)
+
+    # 2) exécuter le pipeline une seule fois pour tout le lot
+    fresh = _annotate(doc_pipe, batch, todo)
+
+    # 3) colonnes dataset (+ point de reprise)
+    _merge_rows(batch, rows, fresh, checkpoint)
+
+    if ends := set(shard_ends).intersection(indices):
+        doc_pipe.close()
+        # indice du shard (0 à num_proc - 1) : stable d'un run à l'autre
+        worker = list(shard_ends).index(min(ends)) if http_share > 1 else None
+        prefix = f"[worker {worker}] " if worker is not None else ""
+        if checkpoint is not None:
+            checkpoint.close()
+            print(f"{prefix}reprise : {checkpoint.reused} documents déjà calculés")
+        _print_stats(doc_pipe, prefix=prefix)
+        _write_metrics(doc_pipe, metrics_dir, worker=worker, prefix=prefix)
+    return batch
+
+
+def _build_streaming(ds, doc_pipe, batch_size, checkpoint, out_dir, pipelined) -> int:
+    """
+    Mode `--streaming` : lots lus à la volée dans l'`IterableDataset`,
+    traités puis écrits en shards Parquet typés dans `out_dir`.
+    Retourne le nombre de documents écrits.
+    """
+    features = ds.features
+    if features is None:                       # schéma inconnu : premier lot
+        first = next(iter(ds.iter(batch_size=1)))
+        features = Features.from_arrow_schema(pa.Table.from_pydict(first).schema)
+    schema = Features({
+        **features,
+        **OUTPUT_FEATURES,
+        "detected_entities": DETECTED_ENTITIES_FEATURE,
+    }).arrow_schema
+    writer = ParquetShardWriter(out_dir, schema)
+    progress = tqdm(desc="pipeline medkit (streaming)", unit=" docs")
+
+    batches = ds.iter(batch_size=batch_size)
+    if pipelined:
+        pending: list[tuple[dict, list]] = []
+
+        def feed():
+            for b in batches:
+                rows, todo = _split_done(b, checkpoint)
+                pending.append((b, rows))
+                yield _make_docs(b, todo)
+
+        for docs in doc_pipe.run_stream(feed()):
+            b, rows = pending.pop(0)
+            fresh = [doc_to_columns(doc, doc_pipe.mesh_exclusions) for doc in docs]
+            writer.write_batch(_merge_rows(b, rows, fresh, checkpoint))
+            progress.update(len(rows))
+    else:
+        for b in batches:
+            rows, todo = _split_done(b, checkpoint)
+            fresh = _annotate(doc_pipe, b, todo)
+            writer.write_batch(_merge_rows(b, rows, fresh, checkpoint))
+            progress.update(len(rows))
+
+    writer.close()
+    progress.close()
+    return writer.num_rows
+
+
+def _longest_first_order(lengths: list[int], num_shards: int) -> list[int]:
+    """
+    Permutation des documents pour `ds.map(num_proc=num_shards)`, qui
+    découpe le dataset en shards contigus : les documents, triés du plus
+    long au plus court, sont distribués en tourniquet, puis chaque shard
+    est mis bout à bout.  Chaque worker reçoit ainsi une charge voisine
+    et commence par ses documents les plus longs (pas de retardataire).
+    """
+    by_length = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    return [by_length[k] for shard in range(num_shards)
+            for k in range(shard, len(by_length), num_shards)]
+
+
+def _shard_ends(n_rows: int, num_shards: int) -> list[int]:
+    """Dernier indice de chaque shard contigu (même découpage que `datasets`)."""
+    div, mod = divmod(n_rows, num_shards)
+    ends, end = [], 0
+    for shard in range(num_shards):
+        end += div + (1 if shard < mod else 0)
+        if end:
+            ends.append(end - 1)
+    return ends
+
 
 # ──────────────────────────────────────────────────────────────
 # build()
@@ -26,119 +371,208 @@ def build(
     umls_api_key: str = typer.Option(None, help="UMLS API key"),
     dataset_name_initial: str = typer.Option(None, help="Nom du dataset Hugging Face initial"),
     dataset_name: str = typer.Option(None, help="Nom du dataset Hugging Face final ([Nom du compte HF]/[Nom du dataset])"),
+    batch_size: int = typer.Option(8, help="Nombre de documents traités ensemble par le pipeline"),
+    device: str = typer.Option("cuda", help="Périphérique du moteur torch : cuda ou cpu"),
+    engine: str = typer.Option("torch", help="Moteur GLiNER : torch ou onnx (int8, CPU)"),
+    num_threads: int = typer.Option(None, help="Threads intra-op pour l'inférence GLiNER"),
+    norm_memo: bool = typer.Option(True, help="Persister le mémo de normalisation MeSH entre deux runs"),
+    prefetch_icd: bool = typer.Option(True, help="Pré-résoudre en parallèle les MeSH ➜ ICD-10 connus avant le pipeline"),
+    umls_mrconso: str = typer.Option(None, help="MRCONSO.RRF local : résolution MeSH ➜ ICD-10 hors-ligne"),
+    icd_release: str = typer.Option("2025AA", help="Release UMLS interrogée pour les codes ICD10CM (API REST)"),
+    num_proc: int = typer.Option(1, help="Processus workers (un modèle GLiNER par worker, CPU)"),
+    pipelined: bool = typer.Option(False, help="Étages NER et réseau (PubMed, UMLS) exécutés en flux"),
+    resume: bool = typer.Option(True, help="Reprendre depuis les points de reprise (documents déjà calculés)"),
+    checkpoint_dir: str = typer.Option(str(DEFAULT_CHECKPOINT_DIR), help="Dossier des points de reprise"),
+    incremental: bool = typer.Option(False, help="Publier sur le Hub par shards Parquet, seuls les shards modifiés sont envoyés"),
+    publish_dir: str = typer.Option(None, help="Publication incrémentale dans ce dossier local (au lieu du Hub)"),
+    streaming: bool = typer.Option(False, help="Lecture en flux (IterableDataset) et écriture directe en shards Parquet"),
+    streaming_dir: str = typer.Option(str(STREAMING_OUT_DIR), help="Dossier des shards Parquet du mode --streaming"),
+    fast: bool = typer.Option(False, help="Voie rapide : colonnes calculées sans objets Medkit (sortie identique)"),
+    gliner_cache: bool = typer.Option(True, help="Cache persistant des entités GLiNER (texte, labels, modèle)"),
+    mesh_exclusions: str = typer.Option(str(CHECKTAGS_PATH), help="Liste JSON des MeSH exclus du mapping ICD-10 (check tags) ; vide : aucun"),
+    metrics_dir: str = typer.Option(str(DEFAULT_METRICS_DIR), help="Dossier du rapport de run (JSON) et du fichier Prometheus ; vide : aucun"),
 ):
     load_dotenv()
+    if streaming and num_proc > 1:
+        raise typer.BadParameter("--streaming et --num-proc > 1 sont exclusifs")
+    if streaming and (publish_dir or incremental):
+        # la publication par shards répartit un `Dataset` complet
+        raise typer.BadParameter("--streaming : --publish-dir et --incremental non pris en charge")
+    if fast and pipelined:
+        raise typer.BadParameter("--fast et --pipelined sont exclusifs")
+    if pipelined and num_proc > 1:
+        raise typer.BadParameter("--pipelined et --num-proc > 1 sont exclusifs")
+    if num_proc > 1 and engine == "torch" and device != "cpu":
+        raise typer.BadParameter("--num-proc > 1 : utiliser --device cpu ou --engine onnx")
+    if num_proc > 1 and not num_threads:
+        # threads intra-op répartis entre les workers
+        num_threads = max(1, (os.cpu_count() or 1) // num_proc)
+
+    if metrics_dir:
+        clear_worker_reports(metrics_dir)    # workers d'un run précédent
 
-    ds = load_dataset(dataset_name_initial, split="train")
+    # streaming : filtre appliqué à la lecture, aucune copie Arrow en cache
+    ds = load_dataset(dataset_name_initial, split="train", streaming=streaming)
     ds = ds.filter(lambda x: x["document_type"] == "Clinical case")
 
     if os.getenv("DEBUG10"):
-        ds = ds.select(range(5))
+        ds = ds.take(5) if streaming else ds.select(range(5))
         print("DEBUG : 5 documents seulement")
 
-    doc_pipe = get_doc_pipeline(umls_api_key=umls_api_key,device="cuda")   # ← le pipeline ci-dessus
+    pipeline_kwargs = dict(umls_api_key=umls_api_key, device=device,
+                           batch_size=batch_size, engine=engine,
+                           num_threads=num_threads, norm_memo=norm_memo,
+                           mrconso=umls_mrconso, icd_release=icd_release,
+                           gliner_cache=gliner_cache, mesh_exclusions=mesh_exclusions or None,
+                           pipelined=pipelined, fast=fast)
+    config_key = pipeline_config_key(**pipeline_kwargs)
+    if not resume:
+        checkpoint_dir = None
+    # pipeline du processus principal (GLiNER chargé seulement s'il sert)
+    doc_pipe = _process_pipeline(pipeline_kwargs)
+
+    if streaming:
+        # pas de pré-chargement global : PubMed et ICD-10 sont pré-résolus
+        # lot par lot par les opérations elles-mêmes
+        checkpoint = _process_checkpoint(checkpoint_dir, config_key)
+        n = _build_streaming(ds, doc_pipe, batch_size, checkpoint,
+                             streaming_dir, pipelined)
+        doc_pipe.close()
+        pmid2mesh.compact()            # journal append-only ➜ cache_pubmed.json
+        if checkpoint is not None:
+            checkpoint.close()
+            print(f"reprise : {checkpoint.reused} documents déjà calculés")
+        _print_stats(doc_pipe)
+        _write_metrics(doc_pipe, metrics_dir)
+        print(f"{n} documents écrits dans {streaming_dir}")
+        if push:
+            api = HfApi(token=hf_token)
+            api.create_repo(dataset_name, repo_type="dataset", exist_ok=True)
+            api.upload_folder(
+                repo_id=dataset_name,
+                repo_type="dataset",
+                folder_path=streaming_dir,
+                path_in_repo="data",
+                allow_patterns="train-*.parquet",
+                delete_patterns="train-*.parquet",
+                commit_message="GLiNER + MeSH + ICD-10-CM + trace",
+            )
+        return
 
     # ------------------------------------------------------------------ #
-    # mapping Medkit ➜ colonnes du dataset
+    # pré-chargement PubMed : tous les PMID absents de cache_pubmed.json,
+    # par lots EFetch de 200 (les PMID non renvoyés sont cachés vides)
     # ------------------------------------------------------------------ #
-    def medkit_map(ex):
-        # 1) construire le document
-        doc = TextDocument(
-            text=ex["article_text"],
-            metadata={"pmid": str(ex["article_id"])}
-        )
-        doc.raw_segment.metadata["pmid"] = str(ex["article_id"])
-
-        # 2) exécuter le pipeline
-        doc_pipe.run([doc])
-
-        # ---------- ICD-10 trace (inchangé) ----------
-        trace = {}
-        for seg in doc.anns:
-            for icd_attr in seg.attrs.get(label="ICD10CM"):
-                code = icd_attr.value
-                meta = trace.setdefault(
-                    code,
-                    {
-                        "cui":        icd_attr.metadata["cui"],
-                        "mesh_id":    icd_attr.metadata["mesh_id"],
-                        "provenance": set(),
-                    },
-                )
-                meta["provenance"].add(icd_attr.metadata["provenance"])
-
-        for meta in trace.values():
-            p = meta["provenance"]
-            meta["provenance"] = "both" if len(p) == 2 else next(iter(p))
-        ex["icd10_trace"] = json.dumps(trace, ensure_ascii=False)
-
-        # ---------- parcourir les segments ----------
-        gliner_mesh   = set()
-        pubmed_mesh   = set()
-        icd_codes     = set()
-        detected      = []
-
-        for seg in doc.anns:
-            if seg.label != "medical_entity":
-                continue
-
-            if "mesh_norm" in seg.keys:       # ⇦ segments GLiNER uniquement
-                # -- GLiNER label
-                gl_label_attr = seg.attrs.get(label="gliner_label")
-                gl_label = gl_label_attr[0].value if gl_label_attr else None
-
-                # -- MeSH
-                mesh_ids = [n.kb_id for n in seg.attrs.get(label="NORMALIZATION")
-                            if n.kb_name == "MeSH"]
-                mesh_id  = mesh_ids[0] if mesh_ids else None
-
-                detected.append(
-                    {"term": seg.text, "label": gl_label, "mesh_id": mesh_id}
-                )
-                if mesh_id:
-                    gliner_mesh.add(mesh_id)
+    n = prefetch_pubmed(str(pmid) for pmid in ds["article_id"])
+    print(f"Pré-chargement PubMed : {n} PMID récupérés via eUtils")
+    pmid2mesh.compact()            # journal append-only ➜ cache_pubmed.json
+
+    # ------------------------------------------------------------------ #
+    # pré-résolution MeSH ➜ ICD-10 : MeSH connus avant le pipeline
+    # (cache PubMed des PMID du dataset, colonnes MeSH déjà présentes)
+    # ------------------------------------------------------------------ #
+    if prefetch_icd:
+        known_mesh = {
+            m for pmid in ds["article_id"] for m in pmid2mesh.get(str(pmid), [])
+        }
+        for col in ("mesh_from_gliner", "pubmed_mesh"):
+            if col in ds.column_names:
+                known_mesh.update(m for ids in ds[col] for m in ids)
+        n = doc_pipe.prefetch_mesh(known_mesh)
+        print(f"Pré-résolution ICD-10 : {len(known_mesh)} MeSH connus, {n} nouveaux UI résolus")
 
-            elif "pubmed_mesh" in seg.keys:
-                # MeSH provenant de PubMed (pas ajouté à detected_entities)
-                for norm in seg.attrs.get(label="NORMALIZATION"):
-                    if norm.kb_name == "MeSH":
-                        pubmed_mesh.add(norm.kb_id)
+    # ------------------------------------------------------------------ #
+    # mapping Medkit ➜ colonnes du dataset (par lots de `batch_size` docs)
+    # pipelined    : étages NER / réseau en flux (cf. pipeline.streaming)
+    # num_proc > 1 : un pipeline par worker, documents les plus longs
+    # d'abord, ordre d'origine rétabli ensuite
+    # ------------------------------------------------------------------ #
+    num_shards = max(1, min(num_proc, len(ds)))
+    if pipelined:
+        # les lots sortent de l'exécuteur en flux, dans l'ordre de `ds.iter` :
+        # `ds.map` (mêmes bornes de lots) n'a plus qu'à les récupérer
+        checkpoint = _process_checkpoint(checkpoint_dir, config_key)
+        # (article_id du lot, lignes reprises), par lot en vol
+        pending: list[tuple[list, list]] = []
 
-            # -- ICD-10
-            for icd_attr in seg.attrs.get(label="ICD10CM"):
-                icd_codes.add(icd_attr.value)
-        # ---------- version réduite des codes CIM-10 ----------
-        codes_reduct = {code.split(".")[0] for code in icd_codes}
+        def feed():
+            for b in ds.iter(batch_size=batch_size):
+                rows, todo = _split_done(b, checkpoint)
+                pending.append((b["article_id"], rows))
+                yield _make_docs(b, todo)
 
-        # ---------- colonnes dataset ----------
-        ex["detected_entities"] = detected
-        ex["mesh_from_gliner"]  = sorted(gliner_mesh)
-        ex["pubmed_mesh"]       = sorted(pubmed_mesh)
-        ex["union_mesh"]        = sorted(gliner_mesh | pubmed_mesh)
-        ex["inter_mesh"]        = sorted(gliner_mesh & pubmed_mesh)
-        ex["icd10_codes"]       = sorted(icd_codes)
-        ex["icd10_codes_reduct"] = sorted(codes_reduct)
-        return ex
+        results = doc_pipe.run_stream(feed())
 
-    ds = ds.map(medkit_map, desc="pipeline medkit")
+        def take_result(batch):
+            # next(results) d'abord : démarre le flux, `feed` remplit `pending`
+            fresh = [doc_to_columns(doc, doc_pipe.mesh_exclusions) for doc in next(results)]
+            article_ids, rows = pending.pop(0)
+            if article_ids != batch["article_id"]:
+                raise RuntimeError(
+                    "--pipelined : lots de `ds.map` et de `ds.iter` désalignés "
+                    f"({article_ids[:1]}… ≠ {batch['article_id'][:1]}…)"
+                )
+            return _merge_rows(batch, rows, fresh, checkpoint)
 
+        ds = ds.map(
+            take_result,
+            batched=True,
+            batch_size=batch_size,
+            load_from_cache_file=False,
+            desc="pipeline medkit (flux)",
+        )
+        doc_pipe.close()
+        if checkpoint is not None:
+            checkpoint.close()
+            print(f"reprise : {checkpoint.reused} documents déjà calculés")
+        _print_stats(doc_pipe)
+        _write_metrics(doc_pipe, metrics_dir)
+    else:
+        order = None
+        if num_shards > 1:
+            order = _longest_first_order([len(t) for t in ds["article_text"]], num_shards)
+            ds = ds.select(order)
+
+        ds = ds.map(
+            medkit_map,
+            batched=True,
+            batch_size=batch_size,
+            with_indices=True,
+            fn_kwargs={
+                "pipeline_kwargs": pipeline_kwargs,
+                "shard_ends": _shard_ends(len(ds), num_shards),
+                "http_share": num_shards,
+                "checkpoint_dir": checkpoint_dir,
+                "config_key": config_key,
+                "metrics_dir": metrics_dir,
+            },
+            num_proc=num_shards if num_shards > 1 else None,
+            load_from_cache_file=False,      # caches MeSH / ICD / PubMed évolutifs
+            desc="pipeline medkit",
+        )
 
+        if order is not None:
+            inverse = [0] * len(order)
+            for new_pos, old_pos in enumerate(order):
+                inverse[old_pos] = new_pos
+            ds = ds.select(inverse).flatten_indices()
+        if num_shards > 1:
+            # processus principal : pré-chargements PubMed / ICD-10
+            # (chaque worker a écrit ses propres mesures)
+            _write_metrics(doc_pipe, metrics_dir)
 
     # ------------------------------------------------------------------ #
     # 4. Schéma + push                                                   #
     # ------------------------------------------------------------------ #
-    ds = ds.cast(Features({
-        **ds.features,
-        "mesh_from_gliner":  Sequence(Value("string")),
-        "pubmed_mesh":       Sequence(Value("string")),
-        "union_mesh":  Sequence(Value("string")),
-        "inter_mesh":  Sequence(Value("string")),
-        "icd10_codes":       Sequence(Value("string")),
-        "icd10_codes_reduct": Sequence(Value("string")),
-        "icd10_trace":     Value("string"),
-    }))
-
-    if push:
+    ds = ds.cast(Features({**ds.features, **OUTPUT_FEATURES}))
+
+    if publish_dir:
+        n = publish(ds, LocalTarget(publish_dir))
+        print(f"Publication locale ({publish_dir}) : {n}")
+    elif push and incremental:
+        n = publish(ds, HubTarget(dataset_name, token=hf_token))
+        print(f"Publication incrémentale ({dataset_name}) : {n}")
+    elif push:
         api = HfApi(token=hf_token)
         ds.push_to_hub(
             dataset_name,
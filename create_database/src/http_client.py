@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# create_database/src/http_client.py
+# ──────────────────────────────────────────────────────────────
+"""Client HTTP partagé par les appels UMLS (UTS) et PubMed (eUtils).
+
+    • une `requests.Session` par processus : connexions keep-alive réutilisées ;
+    • un seau à jetons par hôte (NCBI : 3 req/s, 10 avec `NCBI_API_KEY` ;
+      UTS : 20 req/s) partagé par tous les threads ;
+    • nouvelles tentatives sur erreur réseau, 429 et 5xx, avec attente
+      exponentielle « full jitter » ou la durée `Retry-After` si fournie ;
+      un 429 suspend tout l'hôte, pas seulement le thread concerné ;
+    • compteurs (`stats`) : requêtes, nouvelles tentatives, 429, attentes ;
+      les mêmes compteurs par hôte, et la latence de chaque tentative,
+      dans le registre `metrics` (rapport de run, Prometheus).
+
+    from create_database.src.http_client import get_client
+    resp = get_client().get(url, timeout=15)
+"""
+
+from __future__ import annotations
+
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import get_metrics
+
+NCBI_HOST = "eutils.ncbi.nlm.nih.gov"
+UTS_HOST = "uts-ws.nlm.nih.gov"
+
+# limites documentées par la NLM (requêtes / seconde)
+DEFAULT_RATES = {
+    NCBI_HOST: 10.0 if os.getenv("NCBI_API_KEY") else 3.0,
+    UTS_HOST: 20.0,
+}
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe : `rate` jetons/s, au plus `burst` d'avance."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Prend un jeton (en attendant si besoin) ; retourne le temps attendu."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            # jeton « emprunté » : on réserve le créneau, l'attente se fait hors verrou
+            delay = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def pause(self, seconds: float) -> None:
+        """Suspend l'hôte (ex. 429) : aucun jeton avant `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    """Durée demandée par l'en-tête `Retry-After` (secondes ou date HTTP)."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):           # en-tête mal formé : délai par défaut
+        return None
+    if date.tzinfo is None:                   # « -0000 » : date UTC sans fuseau
+        date = date.replace(tzinfo=timezone.utc)
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+class RateLimitedClient:
+    """
+    Session HTTP avec limitation de débit par hôte et nouvelles tentatives.
+
+    Parameters
+    ----------
+    rates : dict[str, float], optional
+        Débit maximal (req/s) par hôte ; complète `DEFAULT_RATES`.
+    default_rate : float
+        Débit des hôtes non listés.
+    max_retries : int
+        Nombre de nouvelles tentatives après le premier essai.
+    backoff_base, backoff_max : float
+        Attente (s) avant la n-ième tentative : uniforme dans
+        [0, min(backoff_max, backoff_base · 2ⁿ)].
+    pool_maxsize : int
+        Connexions keep-alive conservées par hôte (≥ nb de threads).
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float] | None = None,
+        default_rate: float = 10.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_maxsize: int = 16,
+    ):
+        self._rates = {**DEFAULT_RATES, **(rates or {})}
+        self._default_rate = default_rate
+        self._buckets: dict[str, TokenBucket] = {}
+        self._share = 1                   # nb de processus se partageant les débits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def set_rate(self, host: str, rate: float) -> None:
+        with self._lock:
+            self._rates[host] = rate
+            if host in self._buckets:
+                self._buckets[host].rate = rate / self._share
+
+    def set_share(self, n_processes: int) -> None:
+        """
+        Les débits sont des limites globales : avec `n_processes` workers
+        ayant chacun leur client, chaque processus n'en utilise qu'une part.
+        """
+        with self._lock:
+            self._share = max(1, n_processes)
+            for host, bucket in self._buckets.items():
+                bucket.rate = self._rates.get(host, self._default_rate) / self._share
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate = self._rates.get(host, self._default_rate) / self._share
+                bucket = TokenBucket(rate)
+                self._buckets[host] = bucket
+            return bucket
+
+    def _count(self, key: str, host: str, n: float = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+        get_metrics().inc(f"http_{key}_total", n, host=host)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET limité et ré-essayé.  Renvoie la dernière réponse obtenue (le
+        statut est à vérifier par l'appelant) ; relève la dernière erreur
+        réseau si aucune tentative n'a abouti.
+        """
+        host = urlsplit(url).netloc
+        bucket = self._bucket(host)
+        for attempt in range(self.max_retries):
+            try:
+                resp = self._send(url, host, bucket, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count("retries", host)
+                time.sleep(self._backoff(attempt))
+                continue
+            if resp.status_code not in _RETRY_STATUS:
+                return resp
+            delay = _retry_after(resp)
+            if delay is None:
+                delay = self._backoff(attempt)
+            if resp.status_code == 429:
+                self._count("throttled", host)
+                bucket.pause(delay)           # tous les threads de l'hôte attendent
+            else:
+                self._count("server_errors", host)
+            self._count("retries", host)
+            resp.close()
+            time.sleep(delay)
+        # dernière tentative : réponse renvoyée telle quelle, erreur relevée
+        return self._send(url, host, bucket, kwargs)
+
+    def _send(self, url: str, host: str, bucket: TokenBucket, kwargs: dict) -> requests.Response:
+        """Une tentative : jeton du débit de l'hôte, requête, mesures."""
+        waited = bucket.acquire()
+        if waited:
+            self._count("rate_limited", host)
+            self._count("rate_limited_seconds", host, waited)
+        self._count("requests", host)
+        t0 = time.perf_counter()
+        try:
+            return self._session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self._count("network_errors", host)
+            raise
+        finally:
+            get_metrics().observe("http_request_seconds", time.perf_counter() - t0, host=host)
+
+
+_client: RateLimitedClient | None = None
+_client_pid: int | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> RateLimitedClient:
+    """Client partagé du processus (recréé après un fork : sockets non partagées)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client, _client_pid = RateLimitedClient(), os.getpid()
+        return _client
+
+
+__all__ = [
+    "DEFAULT_RATES",
+    "NCBI_HOST",
+    "RateLimitedClient",
+    "TokenBucket",
+    "UTS_HOST",
+    "get_client",
+]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# create_database/src/mesh_dict_bin.py
+# ──────────────────────────────────────────────────────────────
+"""Format binaire compact du dictionnaire MeSH (`mesh_dict.bin`).
+
+Même contenu que `mesh_dict.json` (liste ordonnée de couples {term, id}),
+mais sans un objet Python par entrée : termes et MeSH ID sont internés
+dans deux tables, chaque entrée n'est qu'un couple d'entiers.  S'y ajoute
+l'index exact du normaliseur (terme normalisé ➜ MeSH ID), trié pour une
+recherche dichotomique directement dans la projection.
+
+    en-tête        magic, taille et date (ns) du JSON source, tailles
+    entry_term     uint32[n_entries]    n° du terme de chaque entrée
+    entry_id       uint32[n_entries]    n° du MeSH ID de chaque entrée
+    term_offsets   uint32[n_terms + 1]  bornes de chaque terme dans le blob
+    id_offsets     uint32[n_ids + 1]    bornes de chaque ID dans le blob
+    exact_id       uint32[n_exact]      n° du MeSH ID de chaque terme normalisé
+    exact_offsets  uint32[n_exact + 1]  bornes de chaque terme normalisé
+    term_blob      UTF-8
+    id_blob        ASCII
+    exact_blob     UTF-8, termes normalisés triés (ordre des octets)
+
+Le fichier est ouvert par `mmap` (lecture seule) : les tableaux sont des
+vues sur la projection, et tous les processus workers partagent la même
+copie dans le cache de pages de l'OS.  La fraîcheur se vérifie par un
+simple `stat` du JSON (taille, date), sans le relire.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import pathlib
+import struct
+import sys
+from array import array
+from collections.abc import Callable, Mapping, Sequence
+
+_MAGIC = b"MESHBIN2"
+# magic, taille et date (ns) du JSON source, n_entries, n_terms, n_ids,
+# n_exact, tailles des blobs termes / ID / termes normalisés
+_HEADER = struct.Struct("<8sQqIIIIIII")
+
+
+def _uint32(values) -> bytes:
+    arr = array("I", values)
+    assert arr.itemsize == 4
+    if sys.byteorder == "big":
+        arr.byteswap()                       # fichier toujours little-endian
+    return arr.tobytes()
+
+
+def _table(strings, encoding):
+    blobs = [s.encode(encoding) for s in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return offsets, b"".join(blobs)
+
+
+def write_mesh_dict_bin(
+    entries,
+    path: pathlib.Path | str,
+    source: pathlib.Path | str,
+    fold: Callable[[str], str],
+) -> pathlib.Path:
+    """
+    Écrit `entries` ({term, id}, ordre conservé) au format binaire
+    (fichier temporaire puis rename atomique).  `source` est le JSON
+    d'origine (taille et date enregistrées) ; `fold` la normalisation des
+    termes de l'index exact (`utils.fold_term`) : un terme présent sous
+    plusieurs ID garde le premier dans l'ordre du fichier.
+    """
+    path = pathlib.Path(path)
+    term_index: dict[str, int] = {}
+    id_index: dict[str, int] = {}
+    exact: dict[bytes, int] = {}
+    entry_term, entry_id = [], []
+    for entry in entries:
+        term, mesh_id = str(entry.get("term") or ""), str(entry.get("id") or "")
+        entry_term.append(term_index.setdefault(term, len(term_index)))
+        entry_id.append(id_index.setdefault(mesh_id, len(id_index)))
+        if term and mesh_id:
+            exact.setdefault(fold(term).encode("utf-8"), entry_id[-1])
+
+    term_offsets, term_blob = _table(term_index, "utf-8")
+    id_offsets, id_blob = _table(id_index, "ascii")
+    exact_keys = sorted(exact)
+    exact_offsets = [0]
+    for key in exact_keys:
+        exact_offsets.append(exact_offsets[-1] + len(key))
+
+    st = pathlib.Path(source).stat()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(_HEADER.pack(_MAGIC, st.st_size, st.st_mtime_ns,
+                             len(entry_term), len(term_index), len(id_index), len(exact_keys),
+                             len(term_blob), len(id_blob), exact_offsets[-1]))
+        for values in (entry_term, entry_id, term_offsets, id_offsets,
+                       [exact[key] for key in exact_keys], exact_offsets):
+            f.write(_uint32(values))
+        f.write(term_blob)
+        f.write(id_blob)
+        f.write(b"".join(exact_keys))
+    os.replace(tmp, path)
+    return path
+
+
+class MeshExactIndex(Mapping):
+    """
+    Index « terme normalisé ➜ MeSH ID » lu dans la projection : recherche
+    dichotomique sur les termes triés, aucune copie par processus.
+    """
+
+    def __init__(self, mesh: "MeshDict"):
+        self._ids = mesh._ids
+        self._exact_id = mesh._exact_id
+        self._offsets = mesh._exact_offsets
+        self._blob = mesh._exact_blob
+        self._n = len(mesh._exact_id)
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, term: str) -> str:
+        key = term.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._key(lo) == key:
+            return self._ids[self._exact_id[lo]]
+        raise KeyError(term)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self._key(i).decode("utf-8")
+
+
+class MeshDict(Sequence):
+    """
+    Vue en lecture seule d'un `mesh_dict.bin` : se comporte comme la liste
+    de `load_mesh_dict` (`len`, indexation, itération sur des {term, id}).
+    `pairs()` itère sur les couples (term, id) sans créer de dict ;
+    `exact_index()` donne l'index exact du normaliseur.
+    """
+
+    def __init__(self, path: pathlib.Path | str):
+        self.path = pathlib.Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.source_size, self.source_mtime_ns, n_entries, n_terms, n_ids,
+         n_exact, term_len, id_len, exact_len) = _HEADER.unpack_from(self._mm)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} : format MeSH binaire inconnu")
+        self._n = n_entries
+
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(n_bytes):
+            nonlocal pos
+            chunk = view[pos:pos + n_bytes]
+            pos += n_bytes
+            return chunk
+
+        def uint32(n):
+            chunk = take(4 * n)
+            if sys.byteorder == "big":           # (copie) ordre des octets natif
+                arr = array("I", chunk)
+                arr.byteswap()
+                return arr
+            return chunk.cast("I")
+
+        self._entry_term = uint32(n_entries)
+        self._entry_id = uint32(n_entries)
+        self._term_offsets = uint32(n_terms + 1)
+        self._id_offsets = uint32(n_ids + 1)
+        self._exact_id = uint32(n_exact)
+        self._exact_offsets = uint32(n_exact + 1)
+        self._term_blob = take(term_len)
+        id_blob = bytes(take(id_len))
+        self._exact_blob = take(exact_len)
+        # table des ID (quelques dizaines de milliers de chaînes courtes) :
+        # décodée une fois, chaque ID est ensuite partagé par ses entrées
+        offs = self._id_offsets
+        self._ids = [sys.intern(id_blob[offs[k]:offs[k + 1]].decode("ascii"))
+                     for k in range(n_ids)]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def term(self, i: int) -> str:
+        t = self._entry_term[i]
+        return str(self._term_blob[self._term_offsets[t]:self._term_offsets[t + 1]], "utf-8")
+
+    def mesh_id(self, i: int) -> str:
+        return self._ids[self._entry_id[i]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return {"term": self.term(i), "id": self.mesh_id(i)}
+
+    def __iter__(self):
+        for term, mesh_id in self.pairs():
+            yield {"term": term, "id": mesh_id}
+
+    def pairs(self):
+        """(term, id) de chaque entrée, dans l'ordre du fichier."""
+        blob, offs, ids = self._term_blob, self._term_offsets, self._ids
+        for t, k in zip(self._entry_term, self._entry_id):
+            yield str(blob[offs[t]:offs[t + 1]], "utf-8"), ids[k]
+
+    def exact_index(self) -> MeshExactIndex:
+        return MeshExactIndex(self)
+
+
+__all__ = ["MeshDict", "MeshExactIndex", "write_mesh_dict_bin"]
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# create_database/src/metrics.py
+# ──────────────────────────────────────────────────────────────
+"""Mesures d'exécution du build : latences par étape, débits, caches, HTTP.
+
+Un registre par processus (`get_metrics`, recréé après un fork comme le
+client HTTP partagé) : histogrammes de latence à bornes fixes et compteurs
+étiquetés.  Une mesure coûte un `perf_counter`, une recherche dichotomique
+et un verrou ; les étapes sont chronométrées par lot, les appels HTTP un à
+un : l'instrumentation reste active en production.
+
+    • `instrument(op, stage)`  : chronomètre `op.run` (appliqué aux quatre
+      opérations de `build_pipeline`) ; segments reçus et rendus ;
+    • `record_stage`           : même mesure pour la voie rapide (`--fast`) ;
+    • `timer` / `observe`      : latences (appels UMLS, lots EFetch, HTTP) ;
+    • `inc`                    : compteurs (caches, nouvelles tentatives…) ;
+    • `write_run_report`       : rapport JSON du run et fichier texte
+      Prometheus (collecteur « textfile » de node_exporter) ;
+    • `clear_worker_reports`   : fichiers des workers du run précédent.
+
+    from create_database.src.metrics import get_metrics
+    with get_metrics().timer("pubmed_efetch_seconds"):
+        ...
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+DEFAULT_METRICS_DIR = pathlib.Path("create_database/data/metrics")
+PREFIX = "medkit_build"
+
+# bornes (s) : de la milliseconde (cache, mémo) à la minute (lot GLiNER sur CPU)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_HELP = {
+    "stage_seconds": "Durée d'exécution d'une étape du pipeline sur un lot.",
+    "stage_items_total": "Segments reçus (in) et rendus (out) par étape.",
+    "http_request_seconds": "Durée d'une tentative HTTP (hors attente du débit).",
+    "icd10_umls_call_seconds": "Durée d'un appel REST UMLS (nouvelles tentatives comprises).",
+    "pubmed_efetch_seconds": "Durée d'un lot EFetch (téléchargement et lecture XML).",
+    "cache_lookups_total": "Consultations des caches (hit / miss).",
+    "pubmed_missing_pmid_total": "Documents sans PMID (aucun MeSH PubMed).",
+}
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Histogramme à bornes fixes (sémantique Prometheus : `le` inclusif)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)       # dernier : au-delà de la dernière borne
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimation par interpolation linéaire dans le seau (cf. `histogram_quantile`)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def to_dict(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, n in zip((*self.bounds, "+Inf"), self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.50), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """Registre thread-safe d'histogrammes et de compteurs étiquetés."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, _Labels], Histogram] = {}
+        self._counters: dict[tuple[str, _Labels], float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple[str, _Labels]:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def elapsed(self) -> float:
+        """Secondes écoulées depuis la création du registre."""
+        return time.perf_counter() - self._t0
+
+    def histograms(self) -> dict[tuple[str, _Labels], Histogram]:
+        with self._lock:
+            copies = {}
+            for key, hist in self._histograms.items():
+                copy = copies[key] = Histogram(hist.bounds)
+                copy.counts, copy.sum, copy.count = list(hist.counts), hist.sum, hist.count
+            return copies
+
+    def counters(self) -> dict[tuple[str, _Labels], float]:
+        with self._lock:
+            return dict(self._counters)
+
+
+_metrics: Metrics | None = None
+_metrics_pid: int | None = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Registre du processus (recréé après un fork : mesures propres au worker)."""
+    global _metrics, _metrics_pid
+    with _metrics_lock:
+        if _metrics is None or _metrics_pid != os.getpid():
+            _metrics, _metrics_pid = Metrics(), os.getpid()
+        return _metrics
+
+
+# ──────────────────────────────────────────────────────────────
+# étapes du pipeline
+# ──────────────────────────────────────────────────────────────
+def record_stage(stage: str, seconds: float, n_in: int, n_out: int) -> None:
+    """Un lot traité par l'étape `stage` : durée, segments reçus et rendus."""
+    metrics = get_metrics()
+    metrics.observe("stage_seconds", seconds, stage=stage)
+    metrics.inc("stage_items_total", n_in, stage=stage, direction="in")
+    metrics.inc("stage_items_total", n_out, stage=stage, direction="out")
+
+
+def instrument(op, stage: str):
+    """
+    Chronomètre `op.run` (remplacé sur l'instance : Medkit, `close`,
+    `stats`, `prefetch`… voient toujours la même opération).
+    """
+    run = op.run
+
+    def timed_run(*inputs):
+        t0 = time.perf_counter()
+        out = run(*inputs)
+        record_stage(stage, time.perf_counter() - t0,
+                     sum(len(x) for x in inputs if x is not None),
+                     len(out) if isinstance(out, list) else 0)
+        return out
+
+    op.run = timed_run
+    return op
+
+
+# ──────────────────────────────────────────────────────────────
+# exports
+# ──────────────────────────────────────────────────────────────
+def _by_label(items: dict, name: str, label: str) -> dict[str, list]:
+    """{valeur du label `label`: [(labels, valeur)…]} pour la mesure `name`."""
+    out: dict[str, list] = {}
+    for (key, labels), value in items.items():
+        if key == name:
+            lab = dict(labels)
+            out.setdefault(lab.get(label, ""), []).append((lab, value))
+    return out
+
+
+def _hit_rate(hits: float, misses: float) -> dict:
+    total = hits + misses
+    return {"hits": hits, "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None}
+
+
+def run_report(metrics: Metrics | None = None, op_stats: dict | None = None,
+               http_stats: dict | None = None, **extra) -> dict:
+    """
+    Rapport du run : débits (documents = segments reçus par l'étape GLiNER,
+    entités = segments rendus par la normalisation MeSH), latences par
+    étape, taux de succès des caches, HTTP par hôte, compteurs bruts.
+    """
+    metrics = metrics or get_metrics()
+    hists, counters = metrics.histograms(), metrics.counters()
+    elapsed = metrics.elapsed()
+
+    items = {}
+    for (name, labels), value in counters.items():
+        if name == "stage_items_total":
+            lab = dict(labels)
+            items[lab["stage"], lab["direction"]] = value
+
+    stages = {}
+    total_busy = sum(h.sum for (name, _), h in hists.items() if name == "stage_seconds") or 1.0
+    for stage, [(_, hist)] in _by_label(hists, "stage_seconds", "stage").items():
+        n_in, n_out = items.get((stage, "in"), 0), items.get((stage, "out"), 0)
+        stages[stage] = {
+            "batches": hist.count,
+            "seconds": round(hist.sum, 3),
+            "share": round(hist.sum / total_busy, 4),
+            "items_in": n_in,
+            "items_out": n_out,
+            "in_per_second": round(n_in / hist.sum, 2) if hist.sum else None,
+            "out_per_second": round(n_out / hist.sum, 2) if hist.sum else None,
+            "latency": hist.to_dict(),
+        }
+
+    caches = {}
+    for cache, rows in _by_label(counters, "cache_lookups_total", "cache").items():
+        by_result = {lab["result"]: value for lab, value in rows}
+        caches[cache] = _hit_rate(by_result.get("hit", 0), by_result.get("miss", 0))
+
+    http: dict[str, dict] = {}
+    for (name, labels), value in counters.items():
+        host = dict(labels).get("host")
+        if host is not None and name.startswith("http_") and name.endswith("_total"):
+            http.setdefault(host, {})[name[len("http_"):-len("_total")]] = value
+    for host, [(_, hist)] in _by_label(hists, "http_request_seconds", "host").items():
+        http.setdefault(host, {})["latency"] = hist.to_dict()
+
+    documents = items.get(("gliner", "in"), 0)
+    entities = items.get(("mesh_norm", "out"), 0)
+    return {
+        "pid": os.getpid(),
+        "started": datetime.fromtimestamp(metrics.started, timezone.utc).isoformat(),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": {
+            "documents": documents,
+            "entities": entities,
+            "documents_per_second": round(documents / elapsed, 3) if elapsed else None,
+            "entities_per_second": round(entities / elapsed, 3) if elapsed else None,
+        },
+        "stages": stages,
+        "caches": caches,
+        "http": http,
+        "http_totals": dict(http_stats or {}),
+        "operations": op_stats or {},
+        **extra,
+        "histograms": [
+            {"name": name, "labels": dict(labels), **hist.to_dict()}
+            for (name, labels), hist in sorted(hists.items())
+        ],
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+    }
+
+
+def _prom_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+
+    def escape(value) -> str:
+        return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def prometheus_text(metrics: Metrics | None = None, op_stats: dict | None = None,
+                    const_labels: dict | None = None, **gauges: float) -> str:
+    """
+    Format d'exposition texte Prometheus : histogrammes, compteurs, compteurs
+    des opérations (`<préfixe>_op_events_total{op, event}`) et jauges libres.
+    """
+    metrics = metrics or get_metrics()
+    const = dict(const_labels or {})
+    lines: list[str] = []
+
+    def header(name: str, kind: str, short: str) -> None:
+        if short in _HELP:
+            lines.append(f"# HELP {name} {_HELP[short]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    by_name: dict[str, list] = {}
+    for (name, labels), hist in sorted(metrics.histograms().items()):
+        by_name.setdefault(name, []).append((dict(labels), hist))
+    for short, series in by_name.items():
+        name = f"{PREFIX}_{short}"
+        header(name, "histogram", short)
+        for labels, hist in series:
+            labels = {**const, **labels}
+            cumulative = 0
+            for bound, n in zip((*hist.bounds, "+Inf"), hist.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_prom_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_prom_labels(labels)} {_prom_number(hist.sum)}")
+            lines.append(f"{name}_count{_prom_labels(labels)} {hist.count}")
+
+    by_name = {}
+    for (name, labels), value in sorted(metrics.counters().items()):
+        by_name.setdefault(name, []).append((dict(labels), value))
+    for op, counters in (op_stats or {}).items():
+        for event, value in counters.items():
+            by_name.setdefault("op_events_total", []).append(({"op": op, "event": event}, value))
+    for short, series in by_name.items():
+        name = f"{PREFIX}_{short}"
+        header(name, "counter", short)
+        for labels, value in series:
+            lines.append(f"{name}{_prom_labels({**const, **labels})} {_prom_number(value)}")
+
+    gauges = {"elapsed_seconds": metrics.elapsed(),
+              "start_time_seconds": metrics.started, **gauges}
+    for short, value in gauges.items():
+        name = f"{PREFIX}_{short}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_prom_labels(const)} {_prom_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: pathlib.Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)                     # jamais de fichier lu à moitié
+
+
+def write_run_report(
+    directory: pathlib.Path | str = DEFAULT_METRICS_DIR,
+    op_stats: dict | None = None,
+    http_stats: dict | None = None,
+    worker: int | None = None,
+    **extra,
+) -> tuple[pathlib.Path, pathlib.Path]:
+    """
+    Écrit `run_report.json` et `pipeline.prom` dans `directory`.  Pour un
+    worker (`--num-proc`), `worker` est l'indice de son shard (0 à
+    num_proc - 1) : les noms sont suffixés par cet indice et les séries
+    Prometheus portent le label `worker`.  Les noms restent les mêmes d'un
+    run à l'autre, chaque fichier remplace celui du run précédent.
+    """
+    directory = pathlib.Path(directory)
+    suffix = f"-{worker}" if worker is not None else ""
+    report = run_report(op_stats=op_stats, http_stats=http_stats, **extra)
+    json_path = directory / f"run_report{suffix}.json"
+    prom_path = directory / f"pipeline{suffix}.prom"
+    _write_atomic(json_path, json.dumps(report, ensure_ascii=False, indent=2))
+    throughput = report["throughput"]
+    _write_atomic(prom_path, prometheus_text(
+        op_stats=op_stats,
+        const_labels={"worker": str(worker)} if worker is not None else None,
+        documents_per_second=throughput["documents_per_second"] or 0.0,
+        entities_per_second=throughput["entities_per_second"] or 0.0,
+    ))
+    return json_path, prom_path
+
+
+def clear_worker_reports(directory: pathlib.Path | str = DEFAULT_METRICS_DIR) -> int:
+    """
+    Supprime les fichiers des workers d'un run précédent
+    (`run_report-*.json`, `pipeline-*.prom`) : à appeler en début de run,
+    avant que les workers n'écrivent, pour que le collecteur textfile ne
+    lise pas les séries d'un worker qui n'existe plus (`--num-proc` réduit).
+    Retourne le nombre de fichiers supprimés.
+    """
+    directory = pathlib.Path(directory)
+    stale = [*directory.glob("run_report-*.json"), *directory.glob("pipeline-*.prom")]
+    for path in stale:
+        path.unlink(missing_ok=True)
+    return len(stale)
+
+
+__all__ = [
+    "DEFAULT_METRICS_DIR",
+    "Histogram",
+    "LATENCY_BUCKETS",
+    "Metrics",
+    "clear_worker_reports",
+    "get_metrics",
+    "instrument",
+    "prometheus_text",
+    "record_stage",
+    "run_report",
+    "write_run_report",
+]
@@ -1,20 +1,94 @@
+import abc
+import hashlib
+import json
+
 from medkit.core.pipeline import Pipeline, PipelineStep
-from medkit.core.doc_pipeline import DocPipeline
+from medkit.core.text import TextDocument
+from .gliner_cache import DEFAULT_GLINER_CACHE_PATH, GlinerSpanCache
 from .gliner_detector import GlinerDetector
-from .mesh_normalizer import MeshNormalizer
-from ..utils import load_simstring_matcher   
-from .icd10_mapper      import ICD10Mapper
+from .gliner_engine import DEFAULT_MODEL
+from .mesh_normalizer import MeshNormalizer, SpanMemo, DEFAULT_MEMO_PATH
+from ..metrics import instrument
+from ..utils import load_mesh_exact_index, load_simstring_matcher, simstring_index_key
+from .icd10_mapper      import CHECKTAGS_PATH, ICD10Mapper, load_mesh_exclusions
 from .pubmed_fetcher import PubMedMeshFetcher
+from .umls_offline import OfflineUMLSResolver, mrconso_source_key
+
+
+GLINER_LABELS = ["disease", "condition", "symptom", "treatment"]
+
+
+def pipeline_config_key(engine: str = "torch", icd_release: str = "2025AA",
+                        mesh_exclusions: str | None = str(CHECKTAGS_PATH),
+                        mrconso: str | None = None, **_) -> str:
+    """
+    Empreinte des paramètres qui influent sur les colonnes produites (modèle,
+    labels, moteur, index Simstring, résolveur UMLS et release ICD-10, MeSH
+    exclus) ; les paramètres d'exécution (device, lots, threads, workers…)
+    sont ignorés.
+    """
+    config = {
+        "model": DEFAULT_MODEL,
+        "labels": GLINER_LABELS,
+        "engine": engine,
+        "simstring": simstring_index_key(),
+        "icd_release": icd_release,
+        # API REST ou MRCONSO.RRF local (version du fichier)
+        "resolver": mrconso_source_key(mrconso) if mrconso else "rest",
+        "mesh_exclusions": sorted(load_mesh_exclusions(mesh_exclusions))
+        if mesh_exclusions else [],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
 
 
-def get_pipeline(umls_api_key : str,device: str = "cuda") -> Pipeline:
+def _build_operations(
+    umls_api_key: str,
+    device: str = "cuda",
+    *,
+    batch_size: int = 8,
+    engine: str = "torch",
+    num_threads: int | None = None,
+    norm_memo: bool = True,
+    mrconso: str | None = None,
+    icd_release: str = "2025AA",
+    gliner_cache: bool = True,
+    mesh_exclusions: str | None = str(CHECKTAGS_PATH),
+):
+    """
+    Opérations du pipeline : (GLiNER, normalisation MeSH, PubMed, ICD-10),
+    chacune chronométrée lot par lot (cf. `metrics.instrument`).
+    Les fonctions ci-dessous lui transmettent leurs `**op_kwargs` tels quels.
+    """
     det  = GlinerDetector(
-        labels=["disease", "condition", "symptom", "treatment"],
+        labels=GLINER_LABELS,
         device=device,
+        batch_size=batch_size,
+        engine=engine,
+        num_threads=num_threads,
+        # entités déjà calculées (même texte, labels, modèle) relues du disque
+        cache=GlinerSpanCache(DEFAULT_GLINER_CACHE_PATH, labels=GLINER_LABELS)
+        if gliner_cache else None,
+    )
+    norm = MeshNormalizer(
+        load_simstring_matcher(),
+        exact_index=load_mesh_exact_index(),   # voie rapide avant Simstring
+        # mémo forme de surface ➜ MeSH, persisté entre deux runs si demandé
+        memo=SpanMemo(simstring_index_key(), path=DEFAULT_MEMO_PATH if norm_memo else None),
     )
-    norm = MeshNormalizer(load_simstring_matcher())
     fetch = PubMedMeshFetcher() 
-    icd  = ICD10Mapper(api_key=umls_api_key)            # modifie les mêmes segments in-place
+    # MRCONSO.RRF local fourni → résolution UMLS hors-ligne (zéro appel réseau)
+    resolver = OfflineUMLSResolver(mrconso=mrconso) if mrconso else None
+    # check tags (ou autre liste JSON) écartés avant toute résolution UMLS
+    exclude = load_mesh_exclusions(mesh_exclusions) if mesh_exclusions else ()
+    icd  = ICD10Mapper(api_key=umls_api_key, resolver=resolver,
+                       icd_release=icd_release,
+                       exclude_mesh=exclude)    # modifie les mêmes segments in-place
+    return (instrument(det, "gliner"), instrument(norm, "mesh_norm"),
+            instrument(fetch, "pubmed"), instrument(icd, "icd10"))
+
+
+def get_pipeline(umls_api_key : str, device: str = "cuda", **op_kwargs) -> Pipeline:
+    det, norm, fetch, icd = _build_operations(umls_api_key, device, **op_kwargs)
 
     steps = [
         # 1) repérage d’entités gliner
@@ -47,11 +121,143 @@ def get_pipeline(umls_api_key : str,device: str = "cuda") -> Pipeline:
     )
 
 
-def get_doc_pipeline(umls_api_key: str, device: str = "cuda") -> DocPipeline:
+def get_stage_pipelines(
+    umls_api_key: str, device: str = "cuda", **op_kwargs,
+) -> tuple[Pipeline, Pipeline]:
+    """
+    Mêmes étapes que `get_pipeline`, réparties en deux sous-pipelines pour
+    l'exécution en flux (cf. `streaming.StreamingDocPipeline`) :
+    • NER (calcul)             : raw_segment ➜ gliner_out ➜ mesh_norm ;
+    • enrichissement (réseau)  : raw_segment ➜ pubmed_mesh, puis ICD-10.
+    """
+    det, norm, fetch, icd = _build_operations(umls_api_key, device, **op_kwargs)
+    ner = Pipeline(
+        steps=[
+            PipelineStep(det, input_keys=["raw_segment"], output_keys=["gliner_out"]),
+            PipelineStep(norm, input_keys=["gliner_out"], output_keys=["mesh_norm"]),
+        ],
+        input_keys=["raw_segment"],
+        output_keys=["mesh_norm"],
+        name="gliner_mesh",
+    )
+    enrich = Pipeline(
+        steps=[
+            PipelineStep(fetch, input_keys=["raw_segment"], output_keys=["pubmed_mesh"]),
+            PipelineStep(icd, input_keys=["mesh_norm", "pubmed_mesh"], output_keys=[""]),
+        ],
+        input_keys=["raw_segment", "mesh_norm"],
+        output_keys=["pubmed_mesh"],
+        name="pubmed_icd10",
+    )
+    return ner, enrich
+
+
+class PipelineOperations(abc.ABC):
+    """
+    Interface commune des pipelines de documents (`BatchDocPipeline`,
+    `StreamingDocPipeline`, `FastDocPipeline`) : fin de run, pré-résolution
+    et compteurs sont délégués aux opérations de `steps`.
+    """
+
+    @property
+    @abc.abstractmethod
+    def steps(self) -> list[PipelineStep]:
+        """Étapes dont les opérations portent caches et compteurs."""
+
+    def close(self) -> None:
+        """Fin de run : laisse chaque opération vider/persister ses caches."""
+        for step in self.steps:
+            if hasattr(step.operation, "close"):
+                step.operation.close()
+
+    def prefetch_mesh(self, mesh_ids) -> int:
+        """Pré-résolution MeSH ➜ ICD-10 déléguée aux opérations concernées."""
+        mesh_ids = set(mesh_ids)
+        return sum(
+            step.operation.prefetch(mesh_ids)
+            for step in self.steps
+            if hasattr(step.operation, "prefetch")
+        )
+
+    @property
+    def mesh_exclusions(self) -> frozenset[str]:
+        """UI MeSH exclus du mapping ICD-10 (colonne `mesh_clean`)."""
+        return frozenset().union(*(
+            step.operation.exclude_mesh
+            for step in self.steps
+            if hasattr(step.operation, "exclude_mesh")
+        ))
+
+    def stats(self) -> dict[str, dict]:
+        """Compteurs exposés par les opérations (attribut `stats`)."""
+        return {
+            type(step.operation).__name__: dict(step.operation.stats)
+            for step in self.steps
+            if hasattr(step.operation, "stats")
+        }
+
+
+class BatchDocPipeline(PipelineOperations):
+    """
+    Équivalent de `medkit.core.doc_pipeline.DocPipeline`, mais qui exécute le
+    `Pipeline` **une seule fois pour tout un lot de documents** :
+
+    • les `raw_segment` des N documents sont passés ensemble à chaque étape
+      (GLiNER batché, un seul appel eUtils pour les PMID manquants, …) ;
+    • chaque segment produit porte `metadata["doc_id"]` (uid du raw_segment
+      source), ce qui permet de ré-injecter les annotations dans le bon doc.
+    """
+
+    def __init__(self, pipeline: Pipeline):
+        self.pipeline = pipeline
+
+    @property
+    def steps(self):
+        return self.pipeline.steps
+
+    def run(self, docs: list[TextDocument]) -> None:
+        docs_by_id: dict[str, TextDocument] = {}
+        raw_segments = []
+        for doc in docs:
+            raw = doc.raw_segment
+            raw.metadata["doc_id"] = raw.uid
+            docs_by_id[raw.uid] = doc
+            raw_segments.append(raw)
+
+        all_output_anns = self.pipeline.run(raw_segments)
+
+        # même normalisation de la sortie que DocPipeline
+        if all_output_anns is None:
+            all_output_anns = ()
+        elif not isinstance(all_output_anns, tuple):
+            all_output_anns = (all_output_anns,)
+
+        for output_anns in all_output_anns:
+            for ann in output_anns:
+                docs_by_id[ann.metadata["doc_id"]].anns.add(ann)
+
+
+def get_doc_pipeline(
+    umls_api_key: str,
+    device: str = "cuda",
+    pipelined: bool = False,
+    fast: bool = False,
+    **op_kwargs,
+) -> PipelineOperations:
     """
-    Enveloppe le `Pipeline` ci-dessus dans un `DocPipeline` pratique :
-    • on passe une liste de `TextDocument`;
+    Enveloppe le `Pipeline` ci-dessus dans un `BatchDocPipeline` pratique :
+    • on passe une liste de `TextDocument` (un lot entier à la fois) ;
     • les annotations créées sont ré-injectées dans chaque doc.
+    `pipelined=True` → `StreamingDocPipeline` (étages NER / réseau en flux).
+    `fast=True`      → `FastDocPipeline` (colonnes sans objets Medkit,
+                       `run_columns` au lieu de `run`).
+    `**op_kwargs`    : options des opérations (cf. `_build_operations`).
     """
-    base_pipe = get_pipeline(umls_api_key, device)
-    return DocPipeline(pipeline=base_pipe)   # pas de labels_by_input_key -> segments RAW
\ No newline at end of file
+    if fast:
+        from .fast_path import FastDocPipeline        # (import circulaire)
+        return FastDocPipeline(*_build_operations(umls_api_key, device, **op_kwargs))
+    if pipelined:
+        from .streaming import StreamingDocPipeline   # (import circulaire)
+        return StreamingDocPipeline(*get_stage_pipelines(umls_api_key, device, **op_kwargs))
+    base_pipe = get_pipeline(umls_api_key, device, **op_kwargs)
+    return BatchDocPipeline(pipeline=base_pipe)   # entrée : segments RAW
@@ -0,0 +1,160 @@
+# create_database/src/pipeline/fast_path.py
+# ------------------------------------------------
+"""
+Voie rapide (`--fast`) : mêmes étapes et mêmes opérations que le pipeline
+Medkit (GLiNER ▸ MeSH ▸ PubMed ▸ ICD-10), mais sans `TextDocument`, sans
+segments intermédiaires ni copies d'attributs :
+
+    texte ─► entités (start, end, label GLiNER)
+          ─► (terme, label, [MeSH ID…])      par entité normalisée
+          ─► [MeSH ID…]                      par PMID
+          ─► [(code, cui)…]                  par MeSH ID
+          ─► colonnes du dataset
+
+Les colonnes produites sont identiques à `cli.doc_to_columns` appliqué au
+document annoté par le pipeline Medkit : les « segments » sont parcourus
+dans le même ordre (entités normalisées puis MeSH PubMed), avec les mêmes
+attributs ICD-10 (cf. `ICD10Mapper._run_doc`).  Vérification :
+`dvpt_scripts/other/TEST_fast_path_equivalence.py`.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+from medkit.core.pipeline import PipelineStep
+
+from ..metrics import record_stage
+from .build_pipeline import PipelineOperations
+from .gliner_detector import GlinerDetector
+from .icd10_mapper import ICD10Mapper
+from .mesh_normalizer import MeshNormalizer
+from .pubmed_fetcher import PubMedMeshFetcher
+
+# « segment » aplati : (label, provenance, texte, label GLiNER, [MeSH ID…])
+_Seg = tuple[str, str, str, str | None, list[str]]
+
+
+class FastDocPipeline(PipelineOperations):
+    """
+    Mêmes opérations que `BatchDocPipeline` (`close`, `prefetch_mesh`,
+    `stats`), mais pas de `run` sur des `TextDocument` : `run_columns`
+    prend le lot sous forme de textes et PMID, et rend directement une
+    ligne de colonnes par document.
+    """
+
+    def __init__(self, det: GlinerDetector, norm: MeshNormalizer,
+                 fetch: PubMedMeshFetcher, icd: ICD10Mapper):
+        self.det = det
+        self.norm = norm
+        self.fetch = fetch
+        self.icd = icd
+
+    @property
+    def steps(self):
+        # mêmes clés que `get_pipeline` (seules les opérations servent ici)
+        return [
+            PipelineStep(self.det, input_keys=["raw_segment"], output_keys=["gliner_out"]),
+            PipelineStep(self.norm, input_keys=["gliner_out"], output_keys=["mesh_norm"]),
+            PipelineStep(self.fetch, input_keys=["raw_segment"], output_keys=["pubmed_mesh"]),
+            PipelineStep(self.icd, input_keys=["mesh_norm", "pubmed_mesh"], output_keys=[""]),
+        ]
+
+    def run_columns(self, texts: list[str], pmids: list[str]) -> list[dict]:
+        """Colonnes du dataset pour chaque document du lot."""
+        if not texts:
+            return []
+
+        # mêmes mesures par étape que les opérations du pipeline Medkit
+        t0 = time.perf_counter()
+
+        # 1) GLiNER (lot entier) puis normalisation MeSH, entité par entité
+        preds = self.det.predict(texts)
+        n_ents = sum(map(len, preds))
+        t1 = time.perf_counter()
+        record_stage("gliner", t1 - t0, len(texts), n_ents)
+        docs: list[list[_Seg]] = []
+        for text, ents in zip(texts, preds):
+            segs = []
+            for ent in ents:
+                start, end = ent["start"], ent["end"]
+                for term, label, mesh_ids in self.norm.match_text(text[start:end], start):
+                    segs.append((label, "gliner", term, ent["label"], mesh_ids))
+            docs.append(segs)
+        n_norm = sum(map(len, docs))
+        t2 = time.perf_counter()
+        record_stage("mesh_norm", t2 - t1, n_ents, n_norm)
+
+        # 2) MeSH PubMed : un « segment » par MeSH
+        pmids = [str(pmid).strip() for pmid in pmids]
+        for segs, mesh_ids in zip(docs, self.fetch.mesh_ids(pmids)):
+            segs.extend(("medical_entity", "pubmed", "", None, [mid]) for mid in mesh_ids)
+        n_segs = sum(map(len, docs))
+        t3 = time.perf_counter()
+        record_stage("pubmed", t3 - t2, len(texts), n_segs - n_norm)
+
+        # 3) résolution groupée de tous les MeSH du lot
+        self.icd.prefetch(mid for segs in docs for seg in segs for mid in seg[4])
+
+        rows = [self._columns(segs) for segs in docs]
+        record_stage("icd10", time.perf_counter() - t3, n_segs, 0)
+        return rows
+
+    def _columns(self, segs: list[_Seg]) -> dict:
+        # ---- provenance MeSH (ordre de première apparition) ----
+        prov_map: dict[str, set[str]] = {}
+        for _, provenance, _, _, mesh_ids in segs:
+            for mid in mesh_ids:
+                prov_map.setdefault(mid, set()).add(provenance)
+        rank = {mid: i for i, mid in enumerate(prov_map)}
+        exclude = self.icd.exclude_mesh
+        records = {
+            mid: [(code, cui, mid, "both" if len(p) == 2 else next(iter(p)))
+                  for code, cui in self.icd.codes(mid)]
+            for mid, p in prov_map.items()
+            if mid not in exclude
+        }
+        self.icd.record_mapped(records)     # écartés : comptés par `prefetch`
+
+        trace: dict[str, dict] = {}
+        gliner_mesh, pubmed_mesh, icd_codes = set(), set(), set()
+        detected = []
+        for label, provenance, term, gl_label, mesh_ids in segs:
+            # attributs ICD-10 du segment, dans l'ordre d'ajout par ICD10Mapper
+            icd = [rec for mid in sorted(set(mesh_ids), key=rank.__getitem__)
+                   for rec in records.get(mid, ())]
+            for code, cui, mid, prov in icd:
+                meta = trace.setdefault(code, {"cui": cui, "mesh_id": mid,
+                                               "provenance": set()})
+                meta["provenance"].add(prov)
+
+            if label != "medical_entity":
+                continue
+            if provenance == "gliner":
+                mesh_id = mesh_ids[0] if mesh_ids else None
+                detected.append({"term": term, "label": gl_label, "mesh_id": mesh_id})
+                if mesh_id:
+                    gliner_mesh.add(mesh_id)
+            else:
+                pubmed_mesh.update(mesh_ids)
+            icd_codes.update(code for code, _, _, _ in icd)
+
+        for meta in trace.values():
+            p = meta["provenance"]
+            meta["provenance"] = "both" if len(p) == 2 else next(iter(p))
+
+        return {
+            "icd10_trace":        json.dumps(trace, ensure_ascii=False),
+            "detected_entities":  detected,
+            "mesh_from_gliner":   sorted(gliner_mesh),
+            "pubmed_mesh":        sorted(pubmed_mesh),
+            "union_mesh":         sorted(gliner_mesh | pubmed_mesh),
+            "inter_mesh":         sorted(gliner_mesh & pubmed_mesh),
+            "mesh_clean":         sorted((gliner_mesh | pubmed_mesh) - exclude),
+            "icd10_codes":        sorted(icd_codes),
+            "icd10_codes_reduct": sorted({code.split(".")[0] for code in icd_codes}),
+        }
+
+
+__all__ = ["FastDocPipeline"]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# create_database/src/pipeline/gliner_cache.py
+# ──────────────────────────────────────────────────────────────
+"""Cache persistant des entités GLiNER, par texte.
+
+La sortie de `GlinerDetector.predict` ne dépend que du texte, des labels,
+du modèle (nom + révision), du moteur et des paramètres d'inférence
+(seuil, fenêtrage).  Ces paramètres forment un espace de noms
+(`namespace`, empreinte sha256) ; dans un espace, chaque texte est repéré
+par son sha256.  Un run qui ne change que les étapes aval (Simstring,
+check tags, release ICD-10…) relit donc les entités sans inférence, et
+sans même charger le modèle si tous les documents sont connus.
+
+Une base SQLite (mode WAL, comme `icd10_cache`) partagée par les workers :
+
+    gliner_spans(namespace, key, spans)   PRIMARY KEY (namespace, key)
+        key     sha256(texte)[:16]
+        spans   [[start, end, indice du label, score], …]   (JSON)
+
+Les entités sont lues à la demande, lot par lot, et les ajouts écrits par
+transactions groupées : la mémoire ne dépend pas de la taille du corpus.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+
+from ..metrics import get_metrics
+
+DEFAULT_GLINER_CACHE_PATH = pathlib.Path("create_database/data/gliner_cache/gliner_spans.sqlite")
+_MAX_VARS = 500                            # clés par requête `IN (…)`
+
+
+def cache_namespace(**config) -> str:
+    """Empreinte des paramètres dont dépend la sortie du détecteur."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class GlinerSpanCache:
+    """
+    Parameters
+    ----------
+    path : Path or str
+        Fichier de la base (créé au besoin).
+    labels : list[str]
+        Labels du détecteur (stockés par indice).
+    flush_every : int
+        Nombre de documents regroupés dans une même transaction.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path | str = DEFAULT_GLINER_CACHE_PATH,
+        labels: list[str] = (),
+        flush_every: int = 256,
+    ):
+        self.path = pathlib.Path(path)
+        self.labels = list(labels)
+        self._label_ids = {label: i for i, label in enumerate(self.labels)}
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._pending: dict[tuple[str, bytes], str] = {}   # (namespace, key) ➜ spans
+        # une connexion par instance, protégée par un verrou (mode --pipelined :
+        # étage NER dans son propre thread)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS gliner_spans ("
+                " namespace TEXT NOT NULL, key BLOB NOT NULL, spans TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()[:16]
+
+    # ---------------- lecture ----------------
+    def get_many(self, namespace: str, texts: list[str]) -> list[list[dict] | None]:
+        """Entités {start, end, label, score} de chaque texte, ou None."""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = {key: self._pending[namespace, key]
+                     for key in keys if (namespace, key) in self._pending}
+            todo = list({key for key in keys if key not in found})
+            for i in range(0, len(todo), _MAX_VARS):
+                chunk = todo[i:i + _MAX_VARS]
+                found.update(self._conn.execute(
+                    "SELECT key, spans FROM gliner_spans WHERE namespace = ?"
+                    f" AND key IN ({', '.join('?' * len(chunk))})",
+                    (namespace, *chunk),
+                ).fetchall())
+
+        results = []
+        for key in keys:
+            spans = found.get(key)
+            get_metrics().inc("cache_lookups_total", cache="gliner",
+                              result="miss" if spans is None else "hit")
+            if spans is None:
+                self.misses += 1
+                results.append(None)
+                continue
+            self.hits += 1
+            results.append([
+                {"start": s, "end": e, "label": self.labels[lab], "score": score}
+                for s, e, lab, score in json.loads(spans)
+            ])
+        return results
+
+    def get(self, namespace: str, text: str) -> list[dict] | None:
+        return self.get_many(namespace, [text])[0]
+
+    # ---------------- écriture ----------------
+    def put(self, namespace: str, text: str, ents: list[dict]) -> None:
+        spans = json.dumps([
+            [ent["start"], ent["end"], self._label_ids[ent["label"]],
+             float(ent.get("score", 0.0))]
+            for ent in ents
+        ])
+        with self._lock:
+            self._pending[namespace, self._key(text)] = spans
+            if len(self._pending) >= self.flush_every:
+                self._commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO gliner_spans (namespace, key, spans) VALUES (?, ?, ?)",
+                ((namespace, key, spans) for (namespace, key), spans in self._pending.items()),
+            )
+        self._pending.clear()
+
+
+__all__ = ["DEFAULT_GLINER_CACHE_PATH", "GlinerSpanCache", "cache_namespace"]
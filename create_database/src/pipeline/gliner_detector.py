@@ -1,30 +1,227 @@
+import re
+
 from medkit.core import Operation
 from medkit.core.text import Segment, Span
-from medkit.core.attribute import Attribute   
-from gliner import GLiNER
+from medkit.core.attribute import Attribute
+
+from .gliner_cache import GlinerSpanCache, cache_namespace
+from .gliner_engine import DEFAULT_MODEL, load_gliner, model_revision
+
+# même découpage en mots que le WhitespaceTokenSplitter de GLiNER :
+# les tailles de fenêtre sont donc exprimées dans l'unité du modèle
+_WORD_RE = re.compile(r"\w+(?:[-_]\w+)*|\S")
+
+
+def split_windows(text: str, window_words: int, overlap_words: int) -> list[tuple[int, int]]:
+    """
+    Découpe `text` en fenêtres de `window_words` mots se chevauchant de
+    `overlap_words` mots.  Retourne les bornes (début, fin) en caractères
+    dans `text` ; un texte court donne une seule fenêtre.
+    """
+    words = [m.span() for m in _WORD_RE.finditer(text)]
+    if not words:
+        return []
+    if len(words) <= window_words:
+        return [(0, len(text))]
+
+    step = max(1, window_words - overlap_words)
+    windows = []
+    for i in range(0, len(words), step):
+        chunk = words[i:i + window_words]
+        windows.append((chunk[0][0], chunk[-1][1]))
+        if i + window_words >= len(words):
+            break
+    return windows
+
+
+def merge_window_entities(ents: list[dict]) -> list[dict]:
+    """
+    Fusionne les entités de fenêtres chevauchantes (offsets déjà ramenés
+    au texte complet) :
+      • doublons exacts (start, end, label) → on garde le meilleur score ;
+      • spans qui se recouvrent (entité coupée en bord de fenêtre) →
+        sélection gloutonne par score, comme le mode `flat_ner` de GLiNER.
+    """
+    best: dict[tuple[int, int, str], dict] = {}
+    for ent in ents:
+        key = (ent["start"], ent["end"], ent["label"])
+        if key not in best or ent.get("score", 0) > best[key].get("score", 0):
+            best[key] = ent
+
+    kept: list[dict] = []
+    for ent in sorted(best.values(), key=lambda e: e.get("score", 0), reverse=True):
+        if any(ent["start"] < k["end"] and k["start"] < ent["end"] for k in kept):
+            continue
+        kept.append(ent)
+    return sorted(kept, key=lambda e: (e["start"], e["end"]))
+
 
 class GlinerDetector(Operation):
-    def __init__(self, labels, device="cuda", out_label="medical_entity"):
+    def __init__(self, labels, device="cuda", out_label="medical_entity",
+                 batch_size=8, threshold=0.5,
+                 window_words=300, overlap_words=50,
+                 engine="torch", num_threads=None, model_name=DEFAULT_MODEL,
+                 cache: GlinerSpanCache | None = None, precompute_labels=True):
         super().__init__(output_label=out_label)
         self._labels = labels
-        self._model = GLiNER.from_pretrained(
-            "Ihor/gliner-biomed-large-v1.0", device=device
+        # engine="onnx" : graphe ONNX int8 sur CPU (cf. gliner_engine) ;
+        # chargé au premier `run` (un seul chargement par processus worker)
+        self._engine_kwargs = dict(
+            engine=engine,
+            device=device,
+            model_name=model_name,
+            num_threads=num_threads,
         )
+        self._loaded_model = None
+        # modèles bi-encodeur : labels encodés une fois au chargement puis
+        # réutilisés à chaque lot (cf. `_encode_labels`)
+        self._precompute_labels = precompute_labels
+        self._labels_embeddings = None
         self.output_label = out_label
+        self._batch_size = batch_size       # taille des lots passés au modèle
+        self._threshold = threshold
+        # fenêtrage : < max_len du modèle (384) pour éviter la troncature
+        self._window_words = window_words
+        self._overlap_words = overlap_words
+        # cache persistant des entités par texte (cf. gliner_cache) : le
+        # modèle n'est chargé que si un document du lot est absent du cache
+        self._cache = cache
+        self._namespace: str | None = None
+        self.stats = {"cached": 0, "inferred": 0}
+
+    @property
+    def _model(self):
+        if self._loaded_model is None:
+            self._loaded_model = load_gliner(**self._engine_kwargs)
+            if self._precompute_labels:
+                self._labels_embeddings = self._encode_labels(self._loaded_model)
+        return self._loaded_model
+
+    def _encode_labels(self, model):
+        """
+        Embeddings des labels fixes, ou None si le modèle ne les sépare pas
+        du texte (uni-encodeur, ex. gliner-biomed : labels dans le prompt).
+        """
+        if getattr(model.config, "labels_encoder", None) is None:
+            return None
+        try:
+            return model.encode_labels(self._labels, batch_size=len(self._labels))
+        except (AttributeError, NotImplementedError):   # ex. graphe ONNX
+            return None
+
+    def _cache_namespace(self) -> str | None:
+        """Espace de noms du cache ; None tant que la révision est inconnue."""
+        if self._namespace is None:
+            revision = model_revision(self._engine_kwargs["model_name"])
+            if revision is not None:
+                self._namespace = cache_namespace(
+                    model=self._engine_kwargs["model_name"],
+                    revision=revision,
+                    engine=self._engine_kwargs["engine"],
+                    labels=list(self._labels),
+                    threshold=self._threshold,
+                    window_words=self._window_words,
+                    overlap_words=self._overlap_words,
+                )
+        return self._namespace
+
+    def predict(self, texts: list[str]) -> list[list[dict]]:
+        """
+        Entités {start, end, label, score, …} de chaque texte (offsets dans
+        le texte complet), lues dans le cache ou calculées par `_infer`.
+        """
+        namespace = self._cache_namespace() if self._cache is not None else None
+        if namespace is not None:
+            results = self._cache.get_many(namespace, texts)
+        else:
+            results = [None] * len(texts)
+        todo = [i for i, ents in enumerate(results) if ents is None]
+        self.stats["cached"] += len(texts) - len(todo)
+        self.stats["inferred"] += len(todo)
+        if not todo:
+            return results
+
+        inferred = self._infer([texts[i] for i in todo])
+        if self._cache is not None:
+            namespace = self._cache_namespace()       # connue une fois le modèle chargé
+        for i, ents in zip(todo, inferred):
+            results[i] = ents
+            if namespace is not None:
+                self._cache.put(namespace, texts[i], ents)
+        return results
+
+    def close(self) -> None:
+        """Fin de run : écrit les entrées en attente du cache."""
+        if self._cache is not None:
+            self._cache.close()
+
+    def _infer(self, texts: list[str]) -> list[list[dict]]:
+        """
+        Inférence GLiNER :
+
+        1. chaque texte est découpé en fenêtres chevauchantes ;
+        2. les fenêtres de tout le lot sont triées par longueur, de sorte
+           que chaque paquet de `batch_size` envoyé à `GLiNER.inference`
+           regroupe des fenêtres de taille voisine (peu de padding) ;
+        3. les offsets sont ramenés au texte d'origine puis les doublons
+           en bord de fenêtre fusionnés.
+        """
+        chunks = [                                  # (i_doc, offset, texte)
+            (i, start, text[start:end])
+            for i, text in enumerate(texts)
+            for start, end in split_windows(text, self._window_words, self._overlap_words)
+        ]
+        chunks.sort(key=lambda c: len(c[2]))
+
+        chunk_ents = []
+        if chunks:
+            model = self._model
+            if self._labels_embeddings is not None:
+                chunk_ents = model.batch_predict_with_embeds(
+                    [c[2] for c in chunks],
+                    self._labels_embeddings,
+                    self._labels,
+                    threshold=self._threshold,
+                    batch_size=self._batch_size,
+                )
+            else:
+                chunk_ents = model.inference(
+                    [c[2] for c in chunks],
+                    self._labels,
+                    threshold=self._threshold,
+                    batch_size=self._batch_size,
+                )
 
-    
+        doc_ents: list[list[dict]] = [[] for _ in texts]
+        for (i, offset, _), ents in zip(chunks, chunk_ents):
+            for ent in ents:
+                doc_ents[i].append({
+                    **ent,
+                    "start": ent["start"] + offset,
+                    "end": ent["end"] + offset,
+                })
+        return [merge_window_entities(ents) for ents in doc_ents]
 
     def run(self, segments):
-        text = segments[0].text if segments else ""
-        ents = self._model.predict_entities(text, self._labels)
+        """
+        Un segment d'entrée = un document (raw_segment) ; un segment
+        `medical_entity` (attribut `gliner_label`) par entité de `predict`.
+        """
+        if not segments:
+            return []
 
+        texts = [seg.text for seg in segments]
         out = []
-        for ent in ents:
-            seg = Segment(
-                label=self.output_label,
-                spans=[Span(ent["start"], ent["end"])],
-                text=text[ent["start"]:ent["end"]],
-            )
-            seg.attrs.add(Attribute(label="gliner_label", value=ent["label"]))
-            out.append(seg)
+        for src, text, ents in zip(segments, texts, self.predict(texts)):
+            # rattachement au document d'origine (cf. BatchDocPipeline)
+            doc_id = src.metadata.get("doc_id")
+            for ent in ents:
+                seg = Segment(
+                    label=self.output_label,
+                    spans=[Span(ent["start"], ent["end"])],
+                    text=text[ent["start"]:ent["end"]],
+                    metadata={"doc_id": doc_id},
+                )
+                seg.attrs.add(Attribute(label="gliner_label", value=ent["label"]))
+                out.append(seg)
         return out
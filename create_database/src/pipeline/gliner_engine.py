@@ -0,0 +1,131 @@
+# create_database/src/pipeline/gliner_engine.py
+# ------------------------------------------------
+"""
+Chargement du modèle GLiNER selon le moteur d'inférence choisi :
+
+    • "torch" : modèle PyTorch d'origine (GPU ou CPU) ;
+    • "onnx"  : graphe ONNX exporté une fois puis quantifié en int8
+                (quantification dynamique), exécuté par ONNX Runtime sur CPU
+                avec un nombre de threads intra-op configurable.
+"""
+
+from pathlib import Path
+
+from gliner import GLiNER
+
+DEFAULT_MODEL = "Ihor/gliner-biomed-large-v1.0"
+ENGINES = ("torch", "onnx")
+
+# export ONNX : create_database/data/models/<modèle>/onnx/
+_MODELS_DIR = Path(__file__).resolve().parents[2] / "data" / "models"
+_ONNX_FILE = "model.onnx"
+_ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def onnx_export_dir(model_name: str = DEFAULT_MODEL) -> Path:
+    """Dossier local de l'export ONNX d'un modèle du Hub."""
+    return _MODELS_DIR / model_name.replace("/", "__") / "onnx"
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL, out_dir: str | Path | None = None) -> Path:
+    """
+    Exporte `model_name` en ONNX puis le quantifie (int8 dynamique).
+
+    Returns
+    -------
+    Path
+        Dossier contenant `model_quantized.onnx`, la config GLiNER et le
+        tokenizer (chargeable tel quel par `GLiNER.from_pretrained`).
+    """
+    out_dir = Path(out_dir) if out_dir else onnx_export_dir(model_name)
+    model = GLiNER.from_pretrained(model_name, map_location="cpu")
+    paths = model.export_to_onnx(
+        out_dir,
+        onnx_filename=_ONNX_FILE,
+        quantized_filename=_ONNX_QUANTIZED_FILE,
+        quantize=True,
+    )
+    if paths.get("quantized_path") is None:
+        raise RuntimeError(
+            "Quantification ONNX impossible (onnxruntime.quantization manquant ?)"
+        )
+    return out_dir
+
+
+def model_revision(model_name: str = DEFAULT_MODEL) -> str | None:
+    """
+    Révision (commit) du modèle dans le cache local du Hub, sans appel
+    réseau ni chargement.  None si le modèle n'a pas encore été téléchargé.
+    Dossier local : chemin + date de modification.
+    """
+    local = Path(model_name)
+    if local.is_dir():
+        return f"{local.resolve()}@{int(local.stat().st_mtime)}"
+
+    from huggingface_hub.constants import HF_HUB_CACHE
+
+    ref = Path(HF_HUB_CACHE) / f"models--{model_name.replace('/', '--')}" / "refs" / "main"
+    return ref.read_text(encoding="utf-8").strip() if ref.is_file() else None
+
+
+def load_gliner(
+    engine: str = "torch",
+    device: str = "cuda",
+    model_name: str = DEFAULT_MODEL,
+    num_threads: int | None = None,
+) -> GLiNER:
+    """
+    Instancie GLiNER pour le moteur demandé.
+
+    Parameters
+    ----------
+    engine : str
+        "torch" ou "onnx".
+    device : str
+        Périphérique du moteur torch ("cuda" / "cpu"). Ignoré pour "onnx"
+        (toujours CPU).
+    model_name : str
+        Identifiant Hugging Face du modèle.
+    num_threads : int, optional
+        Threads intra-op (torch.set_num_threads / SessionOptions ONNX).
+        None → valeur par défaut de la bibliothèque.
+    """
+    if engine == "torch":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return GLiNER.from_pretrained(model_name, device=device)
+
+    if engine == "onnx":
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise RuntimeError(
+                "Le moteur 'onnx' nécessite onnxruntime (pip install onnxruntime)"
+            ) from exc
+
+        onnx_dir = onnx_export_dir(model_name)
+        if not (onnx_dir / _ONNX_QUANTIZED_FILE).is_file():
+            print(f"Export ONNX int8 de {model_name} → {onnx_dir}")
+            export_onnx(model_name, onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+
+        return GLiNER.from_pretrained(
+            str(onnx_dir),
+            load_onnx_model=True,
+            onnx_model_file=_ONNX_QUANTIZED_FILE,
+            session_options=options,
+            local_files_only=True,
+        )
+
+    raise ValueError(f"Moteur GLiNER inconnu : {engine!r} (attendu : {ENGINES})")
+
+
+__all__ = [
+    "DEFAULT_MODEL", "ENGINES", "export_onnx", "load_gliner", "model_revision", "onnx_export_dir",
+]
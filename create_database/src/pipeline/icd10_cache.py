@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# create_database/src/pipeline/icd10_cache.py
+# ──────────────────────────────────────────────────────────────
+"""Backends de cache MeSH → ICD-10-CM utilisés par `ICD10Mapper`.
+
+Une entrée du cache a toujours le format historique du fichier JSON :
+
+    {ui: {"cuis": [...], "icd10": [{"code": ..., "cui": ...}, ...]}}
+
+Deux implémentations partagent la même interface
+(`load_all`, `get`, `put`, `flush`, `close`) :
+
+    • JsonICD10Cache   : fichier JSON unique, réécrit par lots (atomique) ;
+    • SqliteICD10Cache : base SQLite en mode WAL, lecteurs et écrivains
+                         concurrents (workers `ds.map(num_proc=...)`),
+                         commits groupés, import initial du JSON existant.
+
+Les codes dépendent de la configuration de résolution (source, release
+UMLS) : chaque cache est restreint à un espace de noms (`namespace`), une
+autre configuration ne relit jamais ses codes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Dict
+
+# ancien cache JSON (source de l'import initial du backend SQLite)
+JSON_CACHE_PATH = pathlib.Path(
+    "create_database/data/dictionnaires/umls_mesh2icd_cache.json"
+)
+SQLITE_CACHE_PATH = JSON_CACHE_PATH.with_suffix(".sqlite")
+
+# configuration qui a produit le cache JSON historique (API REST, 2025AA)
+JSON_CACHE_NAMESPACE = "rest:2025AA"
+
+Entry = Dict[str, list]
+
+
+# --------------------------------------------------------------------------- #
+# 1) JSON                                                                     #
+# --------------------------------------------------------------------------- #
+class JsonICD10Cache:
+    """
+    Cache JSON mono-processus ; écrit tous les `flush_every` ajouts.
+    Avec un `namespace`, un fichier par espace : `<stem>.<namespace>.json`.
+    """
+
+    def __init__(self, path: pathlib.Path | str = JSON_CACHE_PATH, flush_every: int = 50,
+                 namespace: str | None = None):
+        path = pathlib.Path(path)
+        if namespace is not None:
+            path = path.with_name(f"{path.stem}.{namespace.replace(':', '-')}{path.suffix}")
+        self._path = path
+        self._flush_every = flush_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        if self._path.is_file():
+            self._data: Dict[str, Entry] = json.loads(
+                self._path.read_text(encoding="utf-8")
+            )
+        else:
+            self._data = {}
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load_all(self) -> Dict[str, Entry]:
+        return dict(self._data)
+
+    def get(self, ui: str) -> Entry | None:
+        return self._data.get(ui)
+
+    def put(self, ui: str, entry: Entry) -> None:
+        with self._lock:
+            self._data[ui] = entry
+            self._pending += 1
+            if self._pending >= self._flush_every:
+                self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._write()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _write(self) -> None:
+        tmp = self._path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._data, indent=2), encoding="utf-8")
+        os.replace(tmp, self._path)
+        self._pending = 0
+
+
+# --------------------------------------------------------------------------- #
+# 2) SQLite (WAL)                                                             #
+# --------------------------------------------------------------------------- #
+class SqliteICD10Cache:
+    """
+    Cache SQLite partagé entre processus.
+
+    Parameters
+    ----------
+    path : Path or str
+        Fichier de la base (créé au besoin).
+    commit_every : int
+        Nombre d'ajouts regroupés dans une même transaction.
+    import_json : Path or str, optional
+        Ancien cache JSON importé une seule fois (sous `JSON_CACHE_NAMESPACE`).
+    namespace : str
+        Configuration de résolution dont relèvent les entrées lues et écrites.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path | str = SQLITE_CACHE_PATH,
+        commit_every: int = 50,
+        import_json: pathlib.Path | str | None = JSON_CACHE_PATH,
+        namespace: str = JSON_CACHE_NAMESPACE,
+    ):
+        self._path = pathlib.Path(path)
+        self.namespace = namespace
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._commit_every = commit_every
+        # ajouts en attente : gardés en mémoire et écrits en une seule
+        # transaction courte, pour ne pas bloquer les autres écrivains
+        self._pending: Dict[str, Entry] = {}
+        # une connexion par instance, protégée par un verrou : l'instance
+        # peut être utilisée depuis plusieurs threads (pré-résolution)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self._path), timeout=60, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS icd10_entries ("
+                " namespace TEXT NOT NULL, ui TEXT NOT NULL, entry TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, ui))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                " key TEXT PRIMARY KEY, value TEXT)"
+            )
+        if import_json is not None:
+            self.import_json(import_json)
+
+    # ---------------- import one-shot ----------------
+    def import_json(self, json_path: pathlib.Path | str) -> int:
+        """
+        Importe un cache JSON existant (une seule fois : marqueur dans `meta`).
+        Les entrées déjà présentes en base sont conservées.
+        Retourne le nombre d'entrées lues.
+        """
+        json_path = pathlib.Path(json_path)
+        with self._lock, self._conn:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'json_imported'"
+            ).fetchone()
+            if done or not json_path.is_file():
+                return 0
+            raw: Dict[str, Entry] = json.loads(json_path.read_text(encoding="utf-8"))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO icd10_entries (namespace, ui, entry) VALUES (?, ?, ?)",
+                ((JSON_CACHE_NAMESPACE, ui, json.dumps(entry)) for ui, entry in raw.items()),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                (str(json_path),),
+            )
+        print(f"Cache ICD-10 : {len(raw)} entrées importées depuis {json_path}")
+        return len(raw)
+
+    # ---------------- lecture ----------------
+    def load_all(self) -> Dict[str, Entry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ui, entry FROM icd10_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+            pending = dict(self._pending)
+        return {**{ui: json.loads(entry) for ui, entry in rows}, **pending}
+
+    def get(self, ui: str) -> Entry | None:
+        with self._lock:
+            if ui in self._pending:
+                return self._pending[ui]
+            row = self._conn.execute(
+                "SELECT entry FROM icd10_entries WHERE namespace = ? AND ui = ?",
+                (self.namespace, ui),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---------------- écriture ----------------
+    def put(self, ui: str, entry: Entry) -> None:
+        with self._lock:
+            self._pending[ui] = entry
+            if len(self._pending) >= self._commit_every:
+                self._commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO icd10_entries (namespace, ui, entry) VALUES (?, ?, ?)",
+                ((self.namespace, ui, json.dumps(entry)) for ui, entry in self._pending.items()),
+            )
+        self._pending.clear()
+
+
+def open_icd10_cache(path: pathlib.Path | str = SQLITE_CACHE_PATH,
+                     namespace: str = JSON_CACHE_NAMESPACE):
+    """Backend choisi d'après l'extension : `.json` → JSON, sinon SQLite."""
+    path = pathlib.Path(path)
+    if path.suffix == ".json":
+        return JsonICD10Cache(path, namespace=namespace)
+    return SqliteICD10Cache(path, namespace=namespace)
+
+
+__all__ = [
+    "JSON_CACHE_NAMESPACE",
+    "JSON_CACHE_PATH",
+    "JsonICD10Cache",
+    "SQLITE_CACHE_PATH",
+    "SqliteICD10Cache",
+    "open_icd10_cache",
+]
@@ -12,7 +12,11 @@ import json
 import os
 import pathlib
 from collections import defaultdict
-from typing import Dict, List
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Iterable, List
+from urllib.parse import urlsplit
 
 import requests
 from medkit.core import Operation
@@ -23,9 +27,19 @@ from urllib.parse import quote
 # --------------------------------------------------------------------------- #
 # 1) chemins et cache                                                         #
 # --------------------------------------------------------------------------- #
-_CACHE_PATH = pathlib.Path(
-    "create_database/data/dictionnaires/umls_mesh2icd_cache.json"
-)
+from .icd10_cache import SQLITE_CACHE_PATH as _CACHE_PATH, open_icd10_cache
+from ..http_client import get_client
+from ..metrics import get_metrics
+
+# check tags MeSH (Humans, Male, Female, Adult…) : jamais de code ICD-10 utile
+CHECKTAGS_PATH = pathlib.Path("create_database/data/dictionnaires/mesh_checktags.json")
+
+
+@lru_cache(maxsize=None)
+def load_mesh_exclusions(path: pathlib.Path | str = CHECKTAGS_PATH) -> frozenset[str]:
+    """UI MeSH exclus du mapping ICD-10 (liste JSON), lus une fois par processus."""
+    with pathlib.Path(path).open(encoding="utf-8") as f:
+        return frozenset(json.load(f))
 
 
 class ICD10Mapper(Operation):
@@ -40,64 +54,116 @@ class ICD10Mapper(Operation):
         self,
         cache_path: pathlib.Path | str = _CACHE_PATH,
         api_key: str | None = None,
+        cache=None,
+        max_workers: int = 6,
+        max_requests_per_second: float = 20.0,
+        resolver=None,
+        icd_release: str = "2025AA",
+        exclude_mesh: Iterable[str] = (),
     ):
+        """
+        `cache` : backend de cache (interface de `icd10_cache`) ; à défaut,
+        ouvert depuis `cache_path` (`.json` → JSON, sinon SQLite/WAL).
+        `max_workers` / `max_requests_per_second` : parallélisme et débit
+        maximal (par hôte, limite UTS : 20 req/s) de `prefetch`.
+        `resolver` : résolveur hors-ligne (ex. `umls_offline.OfflineUMLSResolver`)
+        exposant `mesh_ui_to_cuis` / `cui_to_icd10cm` ; None → API REST UTS.
+        `icd_release` : release UMLS interrogée pour les atomes ICD10CM (REST).
+        Le cache ouvert depuis `cache_path` est restreint à la configuration
+        de résolution (`namespace` : « rest:<release> » ou `resolver.source_key`).
+        `exclude_mesh` : UI MeSH jamais mappés (ex. `load_mesh_exclusions()`,
+        check tags) : ni résolus, ni attachés, ni dans la trace.
+        """
         super().__init__(output_label=None)          # step terminal
-        self._cache_path = pathlib.Path(cache_path)
+        self.namespace = (getattr(resolver, "source_key", "offline") if resolver is not None
+                          else f"rest:{icd_release}")
+        self._cache = (cache if cache is not None
+                       else open_icd10_cache(cache_path, namespace=self.namespace))
 
         # -------- cache en mémoire --------
-        if self._cache_path.is_file():
-            raw_cache: Dict[str, Dict[str, list]] = json.loads(
-                self._cache_path.read_text(encoding="utf-8")
-            )
-        else:
-            raw_cache = {}
-            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # deux vues pratiques ⬇
-        # vue “codes” : list[(code, cui)]
-        self._mesh2codes: Dict[str, List[tuple[str, str | None]]] = {
-            ui: [(d["code"], d.get("cui")) for d in entry.get("icd10", [])]
-            for ui, entry in raw_cache.items()
-        }
-
-        # vue “cui principal”
-        self._mesh2cui: Dict[str, str | None] = {
-            ui: (entry["icd10"][0]["cui"] if entry.get("icd10") else None)
-            for ui, entry in raw_cache.items()
-        }
-
-        # stockage brut pour sauvegarde
-        self._raw_cache = raw_cache
+        raw_cache: Dict[str, Dict[str, list]] = self._cache.load_all()
+        self._mesh2codes: Dict[str, List[tuple[str, str | None]]] = {}
+        self._mesh2cui: Dict[str, str | None] = {}
+        for ui, entry in raw_cache.items():
+            self._load_entry(ui, entry)
 
         # ---------- API UMLS ----------
+        self._resolver = resolver
+        self._icd_release = icd_release
         self._api_key = api_key or os.getenv("UMLS_API_KEY")
-        if not self._api_key:
+        if not self._api_key and resolver is None:
             raise RuntimeError("UMLS_API_KEY manquant (variable d’environnement)")
-        self._session = requests.Session()
+        # client partagé (pool keep-alive, débit par hôte, retries / 429)
+        self._http = get_client()
+        self._http.set_rate(urlsplit(self._BASE).netloc, max_requests_per_second)
+        self._max_workers = max_workers
+
+        self.exclude_mesh: frozenset[str] = frozenset(exclude_mesh)
+        # UI MeSH distincts mappés / écartés (une résolution UMLS chacun) /
+        # en échec de résolution au moins une fois
+        self.stats = {"mapped": 0, "excluded": 0, "failed": 0}
+        self._seen_ui: dict[str, set[str]] = {"mapped": set(), "excluded": set(), "failed": set()}
+        # plusieurs lots peuvent être mappés en même temps (`--pipelined`) :
+        # compteurs sous verrou, un UI en cours de résolution n'est résolu
+        # qu'une fois (les autres threads attendent son `Future`)
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+
+    def _count_ui(self, key: str, mesh_ids: Iterable[str]) -> None:
+        with self._lock:
+            seen = self._seen_ui[key]
+            seen.update(mesh_ids)
+            self.stats[key] = len(seen)
+
+    def record_mapped(self, mesh_ids: Iterable[str]) -> None:
+        """Compte les UI mappés d'un document (cf. `stats`, voie rapide)."""
+        self._count_ui("mapped", mesh_ids)
+
+    def _load_entry(self, ui: str, entry: Dict[str, list]) -> None:
+        """Alimente les deux vues mémoire à partir d'une entrée du cache."""
+        # vue “codes” : list[(code, cui)]
+        self._mesh2codes[ui] = [(d["code"], d.get("cui")) for d in entry.get("icd10", [])]
+        # vue “cui principal”
+        self._mesh2cui[ui] = entry["icd10"][0]["cui"] if entry.get("icd10") else None
+
+    def close(self) -> None:
+        """Fin de run : écrit les ajouts en attente dans le cache."""
+        self._cache.flush()
 
     # ------------------------------------------------------------------ #
     # 2. helpers UMLS                                                    #
     # ------------------------------------------------------------------ #
+    def _get_json(self, url: str) -> dict:
+        with get_metrics().timer("icd10_umls_call_seconds"):
+            resp = self._http.get(url, timeout=15)
+        # 429 / 5xx rendus après épuisement des retries : échec, pas « aucun code »
+        resp.raise_for_status()
+        return resp.json()
+
     def _mesh_ui_to_cuis(self, ui: str) -> list[str]:
         """UI MeSH → liste (éventuelle) de CUI (souvent une seule)."""
+        if self._resolver is not None:
+            return self._resolver.mesh_ui_to_cuis(ui)
         url = f"{self._BASE}/content/current/source/MSH/{quote(ui)}?apiKey={self._api_key}"
-        data = self._session.get(url, timeout=15).json()
+        data = self._get_json(url)
         concepts = data.get("result", {}).get("concepts")
         if not concepts:
             return []
 
-        data2 = self._session.get(f"{concepts}&apiKey={self._api_key}", timeout=15).json()
+        data2 = self._get_json(f"{concepts}&apiKey={self._api_key}")
         return [
             res["ui"]
             for res in (data2.get("result") or {}).get("results", [])
         ]
 
     def _cui_to_icd10cm(self, cui: str) -> list[str]:
+        if self._resolver is not None:
+            return self._resolver.cui_to_icd10cm(cui)
         url = (
-            f"{self._BASE}/content/2025AA/CUI/{cui}"
+            f"{self._BASE}/content/{self._icd_release}/CUI/{cui}"
             f"/atoms?sabs=ICD10CM&pageSize=200&apiKey={self._api_key}"
         )
-        atoms = self._session.get(url, timeout=15).json().get("result", [])
+        atoms = self._get_json(url).get("result", [])
         return sorted({
             a["code"].split("/")[-1]
             for a in atoms
@@ -113,43 +179,129 @@ class ICD10Mapper(Operation):
         Met à jour le cache :
             {ui: {"cuis": [...], "icd10": [{"code": ..., "cui": ...}, ...]}}
         """
-        if ui in self._mesh2codes:
+        codes = self._mesh2codes.get(ui)
+        if codes is not None:
             # valeur déjà au bon format [(code, cui), ...]
+            get_metrics().inc("cache_lookups_total", cache="icd10", result="hit")
+            return codes
+
+        with self._lock:
+            if ui in self._mesh2codes:              # résolu entre-temps
+                return self._mesh2codes[ui]
+            fut = self._inflight.get(ui)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[ui] = Future()
+        if not owner:
+            return fut.result()                     # résolu par un autre thread
+        try:
+            result = self._fetch_mesh(ui)
+        except BaseException as exc:
+            fut.set_exception(exc)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[ui]
+
+    def _fetch_mesh(self, ui: str) -> list[tuple[str, str | None]]:
+        """Résolution d'un UI absent de la mémoire : cache partagé, puis UMLS."""
+        # entrée éventuellement ajoutée par un autre processus depuis le départ
+        entry = self._cache.get(ui)
+        if entry is not None:
+            get_metrics().inc("cache_lookups_total", cache="icd10", result="hit")
+            self._load_entry(ui, entry)
             return self._mesh2codes[ui]
+        get_metrics().inc("cache_lookups_total", cache="icd10", result="miss")
 
-        cuis = self._mesh_ui_to_cuis(ui)            # ex. ['C12345', 'C67890']
+        # CUI triés : l'ordre rendu dépend de la source (recherche UTS, ordre
+        # du MRCONSO.RRF) ; trié, un code porté par plusieurs CUI reçoit le
+        # même CUI quelle que soit la voie
+        cuis = sorted(self._mesh_ui_to_cuis(ui))    # ex. ['C12345', 'C67890']
         pairs: list[tuple[str, str | None]] = []
 
         for cui in cuis:
             for code in self._cui_to_icd10cm(cui):
                 pairs.append((code, cui))
 
-        # dé-duplication éventuelle (on garde le 1er CUI rencontré)
+        # dé-duplication éventuelle (on garde le 1er CUI, le plus petit)
         seen: dict[str, str | None] = {}
         for code, cui in pairs:
             seen.setdefault(code, cui)
 
         result = sorted(seen.items())               # [(code, cui), ...]
-        self._mesh2codes[ui] = result
         self._mesh2cui[ui]   = result[0][1] if result else None   # « principal »
+        self._mesh2codes[ui] = result
 
-        # ► sauvegarde brute
-        self._raw_cache[ui] = {
+        # ► sauvegarde brute (écriture groupée par le backend)
+        self._cache.put(ui, {
             "cuis": cuis,
             "icd10": [{"code": c, "cui": cu} for c, cu in result],
-        }
-        self._cache_path.write_text(json.dumps(self._raw_cache, indent=2),
-                                    encoding="utf-8")
+        })
 
         return result
 
 
+    # ------------------------------------------------------------------ #
+    # 3 bis. pré-résolution concurrente                                  #
+    # ------------------------------------------------------------------ #
+    def prefetch(self, mesh_ids: Iterable[str]) -> int:
+        """
+        Résout en parallèle (`max_workers` threads, débit borné par hôte)
+        tous les UI MeSH absents du cache (hors `exclude_mesh`).  Ensuite, `map_mesh_ids` sur ces
+        UI n'est plus qu'une lecture en mémoire.
+
+        Un échec (réseau, réponse d'erreur UMLS) est compté dans
+        `stats["failed"]` ; l'UI n'est pas mis en cache et sera retenté à
+        sa prochaine occurrence (cf. `_codes`).
+
+        Returns
+        -------
+        int
+            Nombre d'UI résolus (API UMLS, MRCONSO local ou cache d'un
+            autre processus) ; les échecs n'y figurent pas.
+        """
+        mesh_ids = {ui for ui in mesh_ids if ui}
+        self._count_ui("excluded", mesh_ids & self.exclude_mesh)
+        todo = sorted(
+            ui for ui in mesh_ids
+            if ui not in self._mesh2codes and ui not in self.exclude_mesh
+        )
+        if not todo:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            resolved = sum(
+                fut.result() is not None
+                for fut in as_completed(pool.submit(self._codes, ui) for ui in todo)
+            )
+        self._cache.flush()
+        return resolved
+
     # ------------------------------------------------------------------ #
     # 4. helpers attributs                                               #
     # ------------------------------------------------------------------ #
+    def _codes(self, mesh_id: str) -> list[tuple[str, str | None]] | None:
+        """
+        `_resolve_mesh`, ou None en cas d'échec : compté dans
+        `stats["failed"]`, rien n'est mis en cache (retenté plus tard) et le
+        build continue, le document n'a simplement pas les codes de cet UI.
+        """
+        try:
+            return self._resolve_mesh(mesh_id)
+        except (requests.RequestException, ValueError):
+            self._count_ui("failed", [mesh_id])
+            return None
+
+    def codes(self, mesh_id: str) -> list[tuple[str, str | None]]:
+        """(code, cui) d'un UI MeSH, sans création d'attributs (cf. `fast_path`)."""
+        return self._codes(mesh_id) or []
+
     def _build_attrs(self, mesh_id: str) -> list[Attribute]:
         attrs: list[Attribute] = []
-        for code, cui in self._resolve_mesh(mesh_id):
+        for code, cui in self.codes(mesh_id):
             attrs.append(
                 Attribute(
                     label="ICD10CM",
@@ -177,21 +329,53 @@ class ICD10Mapper(Operation):
         mesh_segments: list[Segment],
         pubmed_segments: list[Segment] | None = None,
     ):
+        """
+        Les segments peuvent provenir de plusieurs documents (exécution
+        batchée) : ils sont regroupés par `metadata["doc_id"]` afin que
+        provenance et trace restent calculées document par document.
+        """
         pubmed_segments = pubmed_segments or []
 
-        # ---- provenance MeSH ----
-        prov_map: dict[str, set[str]] = {}
+        by_doc: dict[str | None, tuple[list[Segment], list[Segment]]] = {}
         for seg in mesh_segments:
-            for norm in seg.attrs.get(label="NORMALIZATION"):
-                if norm.kb_name == "MeSH":
-                    prov_map.setdefault(norm.kb_id, set()).add("gliner")
-
+            by_doc.setdefault(seg.metadata.get("doc_id"), ([], []))[0].append(seg)
         for seg in pubmed_segments:
-            for norm in seg.attrs.get(label="NORMALIZATION"):
-                if norm.kb_name == "MeSH":
-                    prov_map.setdefault(norm.kb_id, set()).add("pubmed")
+            by_doc.setdefault(seg.metadata.get("doc_id"), ([], []))[1].append(seg)
+
+        # résolution groupée de tous les MeSH du lot avant le mapping par doc
+        self.prefetch(
+            norm.kb_id
+            for seg in mesh_segments + pubmed_segments
+            for norm in seg.attrs.get(label="NORMALIZATION")
+            if norm.kb_name == "MeSH"
+        )
 
-        union_mesh = list(prov_map)
+        for doc_mesh, doc_pubmed in by_doc.values():
+            self._run_doc(doc_mesh, doc_pubmed)
+
+        return []            # step terminal
+
+    def _run_doc(
+        self,
+        mesh_segments: list[Segment],
+        pubmed_segments: list[Segment],
+    ) -> None:
+        # ---- provenance MeSH + index MeSH ID ➜ annotations (un seul passage) ----
+        prov_map: dict[str, set[str]] = {}
+        anns_by_mesh: dict[str, list[Segment]] = {}
+        for segments, provenance in ((mesh_segments, "gliner"), (pubmed_segments, "pubmed")):
+            for seg in segments:
+                for norm in seg.attrs.get(label="NORMALIZATION"):
+                    if norm.kb_name != "MeSH":
+                        continue
+                    prov_map.setdefault(norm.kb_id, set()).add(provenance)
+                    anns = anns_by_mesh.setdefault(norm.kb_id, [])
+                    if not anns or anns[-1] is not seg:     # une fois par annotation
+                        anns.append(seg)
+
+        # (UI écartés déjà comptés par `prefetch`, appelé sur tout le lot)
+        union_mesh = [mid for mid in prov_map if mid not in self.exclude_mesh]
+        self.record_mapped(union_mesh)
 
         # ---- mapping MeSH → ICD-10 ----
         attrs = self.map_mesh_ids(union_mesh)
@@ -213,11 +397,8 @@ class ICD10Mapper(Operation):
                 },
             )
             # ajouter seulement aux annotations portant ce MeSH
-            for ann in mesh_segments + pubmed_segments:
-                for norm in ann.attrs.get(label="NORMALIZATION"):
-                    if norm.kb_name == "MeSH" and norm.kb_id == mid:
-                        ann.attrs.add(attr.copy())
-                        break
+            for ann in anns_by_mesh[mid]:
+                ann.attrs.add(attr.copy())
 
         # ---- trace JSON au niveau (première) annotation ----
         if mesh_segments or pubmed_segments:
@@ -228,5 +409,3 @@ class ICD10Mapper(Operation):
                     value=json.dumps(trace, ensure_ascii=False),
                 )
             )
-
-        return []            # step terminal
@@ -1,8 +1,115 @@
 # create_database/src/pipeline/mesh_normalizer.py
 # ------------------------------------------------
+import fcntl
+import json
+import os
+import pathlib
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+
 from medkit.core import Operation
-from medkit.core.text import Segment
-from medkit.text.ner import SimstringMatcher
+from medkit.core.text import Entity, EntityNormAttribute, Segment, Span, span_utils
+from medkit.text.ner._base_simstring_matcher import BaseSimstringMatcher
+
+from ..metrics import get_metrics
+from ..utils import fold_term
+
+DEFAULT_MEMO_PATH = pathlib.Path(
+    "create_database/data/dictionnaires/mesh_norm_memo.json"
+)
+
+# résultat mémorisé pour un texte : [(début, fin, label, [(kb_id, score), …]), …]
+# (offsets relatifs au début du segment source)
+_Matches = list[tuple[int, int, str, list[tuple[str, float]]]]
+
+
+class SpanMemo:
+    """
+    Mémo LRU borné « forme de surface normalisée → résultat du matcher ».
+
+    La clé combine le texte normalisé (`fold_term`) et la configuration du
+    matcher (`config_key`, ex. `utils.simstring_index_key`) : un mémo
+    persisté avec une autre configuration est ignoré au chargement.
+
+    Parameters
+    ----------
+    config_key : str
+        Identifiant de la configuration du matcher.
+    max_size : int
+        Nombre maximal d'entrées conservées (les moins récentes sont évincées).
+    path : str or Path, optional
+        Fichier JSON de persistance entre deux runs (None → mémoire seule).
+    """
+
+    def __init__(self, config_key: str, max_size: int = 100_000,
+                 path: str | pathlib.Path | None = None):
+        self.config_key = config_key
+        self.max_size = max_size
+        self.path = pathlib.Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, _Matches] = OrderedDict()
+
+        for text, matches in self._read_entries()[-max_size:]:
+            self._data[text] = matches
+
+    def _read_entries(self) -> list[tuple[str, _Matches]]:
+        """Entrées persistées pour la même configuration (plus anciennes d'abord)."""
+        if not (self.path and self.path.is_file()):
+            return []
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            return []
+        if raw.get("config_key") != self.config_key:
+            return []
+        return [
+            (text, [(start, end, label, [tuple(n) for n in norms])
+                    for start, end, label, norms in matches])
+            for text, matches in raw.get("entries", [])
+        ]
+
+    def get(self, key: str) -> _Matches | None:
+        matches = self._data.get(key)
+        get_metrics().inc("cache_lookups_total", cache="mesh_memo",
+                          result="miss" if matches is None else "hit")
+        if matches is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return matches
+
+    def put(self, key: str, matches: _Matches) -> None:
+        self._data[key] = matches
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def save(self) -> None:
+        """
+        Écriture atomique (fichier temporaire puis rename), sous verrou.
+        Les entrées persistées entre-temps par d'autres processus (workers
+        `--num-proc`) sont fusionnées, les nôtres passant en plus récentes.
+        """
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_suffix(".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = {k: v for k, v in self._read_entries() if k not in self._data}
+            entries.update(self._data)
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(
+                json.dumps({"config_key": self.config_key,
+                            "entries": list(entries.items())[-self.max_size:]},
+                           ensure_ascii=False),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
 
 
 class MeshNormalizer(Operation):
@@ -13,16 +120,177 @@ class MeshNormalizer(Operation):
 
     Paramètres
     ----------
-    matcher : SimstringMatcher
+    matcher : BaseSimstringMatcher
         Instance déjà paramétrée avec ses rules MeSH.
     output_label : str, default="normalized"
         Clé produite dans le pipeline pour identifier la sortie.
         (Concrètement, on renvoie les mêmes segments enrichis.)
+    exact_index : Mapping[str, str], optional
+        Index « terme normalisé → MeSH ID » (cf. `utils.load_mesh_exact_index`)
+        consulté avant le matcher : un segment dont le texte entier est un
+        terme du dictionnaire est résolu sans recherche Simstring.
+    memo : SpanMemo, optional
+        Mémo des résultats du matcher, partagé par tous les documents
+        traités par ce normaliseur.
     """
 
-    def __init__(self, matcher: SimstringMatcher, output_label: str = "normalized"):
+    def __init__(
+        self,
+        matcher: BaseSimstringMatcher,
+        output_label: str = "normalized",
+        exact_index: Mapping[str, str] | None = None,
+        memo: SpanMemo | None = None,
+    ):
         super().__init__(output_label=output_label)
         self._matcher = matcher
+        self._exact_index = exact_index or {}
+        self.memo = memo
+        # nb de segments résolus par chaque voie
+        self.stats = {"exact": 0, "memo": 0, "fuzzy": 0, "unmatched": 0}
+
+    # ------------------------------------------------------------------
+    # voie rapide : correspondance exacte sur le texte complet du segment
+    # ------------------------------------------------------------------
+    def _exact_id(self, text: str) -> str | None:
+        if not (self._matcher.min_length <= len(text) <= self._matcher.max_length):
+            return None
+        if not (text[:1].isalnum() and text[-1:].isalnum()):
+            return None
+        return self._exact_index.get(fold_term(text))
+
+    def _exact_match(self, segment: Segment) -> Entity | None:
+        """
+        Entité identique à celle que produirait le matcher, ou None.
+
+        Le matcher ne considère que des candidats de `min_length` à
+        `max_length` caractères qui commencent et finissent par un
+        caractère alphanumérique ; hors de ces bornes on laisse la main
+        au matcher.  Dans ces bornes, un terme identique après
+        normalisation donne un score de 1 sur tout le segment, qui l'emporte
+        sur tous les candidats chevauchants.
+        """
+        text = segment.text
+        mesh_id = self._exact_id(text)
+        if mesh_id is None:
+            return None
+
+        ent_text, spans = span_utils.extract(text, segment.spans, [(0, len(text))])
+        entity = Entity(label="medical_entity", text=ent_text, spans=spans)
+        entity.attrs.add(
+            EntityNormAttribute(
+                kb_name="MeSH",
+                kb_id=mesh_id,
+                kb_version=None,
+                term=None,
+                score=1.0,
+            )
+        )
+        return entity
+
+    # ------------------------------------------------------------------
+    # mémo : recherche Simstring mise en cache par forme normalisée
+    # ------------------------------------------------------------------
+    def _memo_key(self, text: str, n_spans: int = 1) -> str | None:
+        """
+        Clé de mémo, ou None si le segment ne peut pas être mémorisé.
+
+        Le matcher ne travaille que sur le texte normalisé ; tant que la
+        normalisation conserve la longueur (cas usuel), deux textes de même
+        forme normalisée donnent les mêmes correspondances aux mêmes offsets.
+        """
+        if self.memo is None or n_spans != 1:
+            return None
+        folded = fold_term(text)
+        if len(folded) != len(text):
+            return None
+        return folded
+
+    def _from_memo(self, segment: Segment, matches: _Matches) -> list[Entity]:
+        entities = []
+        for start, end, label, norms in matches:
+            text, spans = span_utils.extract(segment.text, segment.spans, [(start, end)])
+            entity = Entity(label=label, text=text, spans=spans)
+            for kb_id, score in norms:
+                entity.attrs.add(
+                    EntityNormAttribute(kb_name="MeSH", kb_id=kb_id,
+                                        kb_version=None, term=None, score=score)
+                )
+            entities.append(entity)
+        return entities
+
+    def _to_memo(self, segment: Segment, entities: list[Entity]) -> _Matches | None:
+        origin = segment.spans[0].start
+        matches: _Matches = []
+        for ent in entities:
+            if len(ent.spans) != 1:
+                return None
+            start = ent.spans[0].start - origin
+            norms = [(n.kb_id, n.score) for n in ent.attrs.get(label="NORMALIZATION")
+                     if n.kb_name == "MeSH"]
+            matches.append((start, start + len(ent.text), ent.label, norms))
+        return matches
+
+    def _lookup(
+        self, key: str | None, make_segment: Callable[[], Segment]
+    ) -> tuple[_Matches | None, list[Entity]]:
+        """
+        Correspondances mémorisées sous `key` : (matches, []) ; à défaut,
+        celles du matcher sur `make_segment()` (construit seulement dans ce
+        cas) : (None, entités), mémorisées au passage.
+        """
+        if key is not None:
+            cached = self.memo.get(key)
+            if cached is not None:
+                self.stats["memo"] += 1
+                return cached, []
+
+        segment = make_segment()
+        entities = self._matcher.run([segment])
+        self.stats["fuzzy" if entities else "unmatched"] += 1
+        if key is not None:
+            matches = self._to_memo(segment, entities)
+            if matches is not None:
+                self.memo.put(key, matches)
+        return None, entities
+
+    def _match(self, segment: Segment) -> list[Entity]:
+        key = self._memo_key(segment.text, len(segment.spans))
+        cached, entities = self._lookup(key, lambda: segment)
+        return entities if cached is None else self._from_memo(segment, cached)
+
+    def match_text(self, text: str, start: int = 0) -> list[tuple[str, str, list[str]]]:
+        """
+        Voie rapide (cf. `fast_path`) : mêmes correspondances que `run` pour
+        un segment d'une seule span (`text` commençant à l'offset `start`),
+        sous forme de tuples (texte, label, [MeSH ID, …]).  Un `Segment`
+        n'est construit que pour interroger le matcher (mémo manqué).
+        """
+        mesh_id = self._exact_id(text)
+        if mesh_id is not None:
+            self.stats["exact"] += 1
+            return [(text, "medical_entity", [mesh_id])]
+
+        cached, entities = self._lookup(
+            self._memo_key(text),
+            lambda: Segment(label="medical_entity", text=text,
+                            spans=[Span(start, start + len(text))]),
+        )
+        if cached is not None:
+            return [(text[s:e], label, [kb_id for kb_id, _ in norms])
+                    for s, e, label, norms in cached]
+        return [
+            (ent.text, ent.label, [n.kb_id for n in ent.attrs.get(label="NORMALIZATION")
+                                   if n.kb_name == "MeSH"])
+            for ent in entities
+        ]
+
+    def close(self) -> None:
+        """
+        Fin de run : persiste le mémo (son taux de succès est compté dans
+        `cache_lookups_total`, affiché par la CLI).
+        """
+        if self.memo is not None:
+            self.memo.save()
 
     # ------------------------------------------------------------------
     # L'API Operation s'attend à ce que `run()` reçoive *une liste* pour
@@ -33,14 +301,27 @@ class MeshNormalizer(Operation):
         Ajoute les codes MeSH **et** recopie les attributs GLiNER
         (gliner_label) sur les nouveaux segments.
         """
-        out = self._matcher.run(segments)           # nouveaux segments
-        # copie tous les attributs du segment source vers sa sortie jumelle
-        for src, dst in zip(segments, out):
-            for attr in src.attrs:
-                dst.attrs.add(attr.copy())
+        out = []
+        for src in segments:
+            # un appel par segment source : le matcher peut renvoyer 0, 1 ou
+            # plusieurs entités, on garde ainsi l'appariement source ➜ sorties
+            exact = self._exact_match(src)
+            if exact is not None:
+                matches = [exact]
+                self.stats["exact"] += 1
+            else:
+                matches = self._match(src)          # nouveaux segments
+
+            doc_id = src.metadata.get("doc_id")
+            for dst in matches:
+                # copie tous les attributs du segment source vers sa sortie
+                for attr in src.attrs:
+                    dst.attrs.add(attr.copy())
+                dst.metadata["doc_id"] = doc_id
+                out.append(dst)
 
         return out   # type: ignore
 
 
 # pour un import direct:  from pipeline.mesh_normalizer import MeshNormalizer
-__all__ = ["MeshNormalizer"]
+__all__ = ["MeshNormalizer", "SpanMemo"]
@@ -8,8 +8,9 @@ from medkit.core.text.entity_norm_attribute import EntityNormAttribute
 # le même cache global déjà utilisé ailleurs
 from create_database.src.pubmed.fetch_mesh import (
     mapping as pmid2mesh,
-    fetch_batch,
+    prefetch,
 )
+from create_database.src.metrics import get_metrics
 
 
 class PubMedMeshFetcher(Operation):
@@ -28,36 +29,41 @@ class PubMedMeshFetcher(Operation):
         super().__init__(output_label=output_label)
 
     # ------------------------------------------------------------------
+    def mesh_ids(self, pmids: list[str]) -> list[list[str]]:
+        """MeSH de chaque PMID (liste vide si PMID absent)."""
+        # documents sans PMID : comptés (cf. `metrics`), affichés en fin de run
+        if missing := sum(not pmid for pmid in pmids):
+            get_metrics().inc("pubmed_missing_pmid_total", missing)
+        # recup mesh : essaie dans le cache, sinon => appels EFetch groupés
+        # (≤ 200 PMID) pour les PMID manquants du lot (mise à jour auto du cache)
+        prefetch(pmids)                  # <── ajoute au dict + cache disque
+        return [pmid2mesh.get(pmid, []) if pmid else [] for pmid in pmids]
+
     def run(self, segments: list[Segment]):
         if not segments:
             return []
 
-        pmid = str(segments[0].metadata.get("pmid", "")).strip()
-        if not pmid:
-            print("Pas de PMID")
-            return []
-        
-        # recup mesh : essaie dans le cache, sinon => appel réseau (et mise à jour automatique du cache)
-        mesh_ids = pmid2mesh.get(pmid)
-        if mesh_ids is None:
-            fetch_batch([pmid])          # <── ajoute au dict + cache disque
-            mesh_ids = pmid2mesh.get(pmid, [])
-
+        # un segment d'entrée = un document ; PMID lu dans ses métadonnées
+        pmids = []
+        for seg in segments:
+            pmids.append(str(seg.metadata.get("pmid", "")).strip())
 
         out_segments: list[Segment] = []
-        for mid in mesh_ids:
-            seg = Segment(
-                label="medical_entity",
-                spans=[Span(0, 0)],           
-                text="",
-                metadata={"provenance": "pubmed"},
-            )
-            seg.attrs.add(
-                EntityNormAttribute(          
-                    kb_name="MeSH",
-                    kb_id=mid,                      
-                    metadata={"provenance": "pubmed"},
+        for seg, mesh_ids in zip(segments, self.mesh_ids(pmids)):
+            doc_id = seg.metadata.get("doc_id")
+            for mid in mesh_ids:
+                out = Segment(
+                    label="medical_entity",
+                    spans=[Span(0, 0)],
+                    text="",
+                    metadata={"provenance": "pubmed", "doc_id": doc_id},
+                )
+                out.attrs.add(
+                    EntityNormAttribute(
+                        kb_name="MeSH",
+                        kb_id=mid,
+                        metadata={"provenance": "pubmed"},
+                    )
                 )
-            )
-            out_segments.append(seg)
+                out_segments.append(out)
         return out_segments
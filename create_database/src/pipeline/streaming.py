@@ -0,0 +1,137 @@
+# create_database/src/pipeline/streaming.py
+# ------------------------------------------------
+"""
+Exécution en flux des étapes du pipeline, par lots de documents :
+
+    lots ──► [NER : GLiNER ▸ MeSH]  ──file bornée──►  [enrichissement :
+              (un thread dédié)                        PubMed ▸ ICD-10,
+                                                       pool de threads] ──► lots
+
+Pendant que le thread NER calcule le lot n + 1, les étapes réseau des lots
+n, n - 1, … attendent eUtils / UMLS dans le pool.  La file entre les deux
+étages (`queue_size`) et le nombre de lots en cours d'enrichissement
+(`max_in_flight`) bornent la mémoire : le thread NER se bloque quand l'aval
+ne suit pas.  Les lots sont rendus dans leur ordre d'arrivée.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+from medkit.core.pipeline import Pipeline
+from medkit.core.text import TextDocument
+
+from .build_pipeline import BatchDocPipeline
+
+_DONE = object()                  # fin du flux d'entrée
+
+
+class StreamingDocPipeline(BatchDocPipeline):
+    """
+    Même interface que `BatchDocPipeline` (`run`, `close`, `prefetch_mesh`,
+    `stats`), plus `run_stream` qui enchaîne les lots en flux.
+
+    Parameters
+    ----------
+    ner : Pipeline
+        Entrée `raw_segment`, sortie `mesh_norm` (calcul, thread dédié).
+    enrich : Pipeline
+        Entrées `raw_segment` et `mesh_norm`, sortie `pubmed_mesh`
+        (appels réseau ; attributs ICD-10 ajoutés en place).
+    queue_size : int
+        Lots NER terminés en attente de l'étage d'enrichissement.
+    enrich_workers : int
+        Lots enrichis simultanément (`ICD10Mapper` et le cache PubMed ne
+        résolvent qu'une fois un UI / PMID demandé par deux lots à la fois).
+    """
+
+    def __init__(self, ner: Pipeline, enrich: Pipeline,
+                 queue_size: int = 2, enrich_workers: int = 2):
+        self.ner = ner
+        self.enrich = enrich
+        self.queue_size = queue_size
+        self.enrich_workers = enrich_workers
+
+    @property
+    def steps(self):
+        return self.ner.steps + self.enrich.steps
+
+    # ------------------------------------------------------------------
+    # étages
+    # ------------------------------------------------------------------
+    def _run_ner(self, docs: list[TextDocument]):
+        raw_segments = []
+        for doc in docs:
+            raw = doc.raw_segment
+            raw.metadata["doc_id"] = raw.uid
+            raw_segments.append(raw)
+        return docs, raw_segments, self.ner.run(raw_segments) or []
+
+    def _run_enrich(self, docs, raw_segments, mesh_segments) -> list[TextDocument]:
+        pubmed_segments = self.enrich.run(raw_segments, mesh_segments) or []
+        docs_by_id = {doc.raw_segment.uid: doc for doc in docs}
+        for ann in list(mesh_segments) + list(pubmed_segments):
+            docs_by_id[ann.metadata["doc_id"]].anns.add(ann)
+        return docs
+
+    # ------------------------------------------------------------------
+    # exécution
+    # ------------------------------------------------------------------
+    def run(self, docs: list[TextDocument]) -> None:
+        for _ in self.run_stream([docs]):
+            pass
+
+    def run_stream(self, batches: Iterable[list[TextDocument]]) -> Iterator[list[TextDocument]]:
+        """
+        Traite les lots de `batches` et les rend annotés, dans le même ordre.
+        Une exception levée dans un étage est relancée ici.
+        """
+        ner_out: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    ner_out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            try:
+                for docs in batches:
+                    if not put(self._run_ner(docs)):
+                        return
+                put(_DONE)
+            except BaseException as exc:   # relancée côté consommateur
+                put(exc)
+
+        ner_thread = threading.Thread(target=producer, name="ner-stage", daemon=True)
+        ner_thread.start()
+        in_flight: deque = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.enrich_workers,
+                                    thread_name_prefix="enrich-stage") as pool:
+                while True:
+                    item = ner_out.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    in_flight.append(pool.submit(self._run_enrich, *item))
+                    # contre-pression : au plus `enrich_workers` lots en cours
+                    if len(in_flight) >= self.enrich_workers:
+                        yield in_flight.popleft().result()
+                while in_flight:
+                    yield in_flight.popleft().result()
+        finally:
+            stop.set()
+            ner_thread.join()
+
+
+__all__ = ["StreamingDocPipeline"]
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# create_database/src/pipeline/umls_offline.py
+# ──────────────────────────────────────────────────────────────
+"""Résolution MeSH → CUI → ICD-10-CM hors-ligne, depuis un MRCONSO.RRF local.
+
+Le fichier MRCONSO.RRF (plusieurs Go) est lu **une seule fois** en flux ;
+seules les lignes utiles sont conservées dans un index SQLite compact :
+
+    mesh_cui(ui, rank, cui)   ← lignes SAB = MSH      (CODE = UI MeSH)
+    cui_icd(cui, code)        ← lignes SAB = ICD10CM  (non supprimées)
+
+L'index est ouvert en lecture seule et mappé en mémoire (`mmap_size`) ;
+`OfflineUMLSResolver` expose les mêmes helpers que la voie REST
+d'`ICD10Mapper` (`mesh_ui_to_cuis`, `cui_to_icd10cm`), donc le cache
+produit a exactement le même format.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+import sqlite3
+import threading
+
+DEFAULT_INDEX_PATH = pathlib.Path(
+    "create_database/data/dictionnaires/umls_mrconso_index.sqlite"
+)
+
+# colonnes MRCONSO.RRF utilisées (cf. documentation UMLS)
+_CUI, _SAB, _CODE, _SUPPRESS = 0, 11, 13, 16
+_MMAP_SIZE = 1 << 30
+
+
+def _source_signature(mrconso: pathlib.Path) -> str:
+    st = mrconso.stat()
+    return f"{mrconso.resolve()}|{st.st_size}|{int(st.st_mtime)}"
+
+
+def mrconso_source_key(mrconso: pathlib.Path | str) -> str:
+    """
+    Identité d'un MRCONSO.RRF (empreinte de chemin, taille et date, sans
+    relire le fichier) : deux versions ne partagent ni points de reprise ni
+    entrées du cache ICD-10.
+    """
+    return _source_key(_source_signature(pathlib.Path(mrconso)))
+
+
+def _source_key(signature: str) -> str:
+    return "mrconso:" + hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+
+def build_mrconso_index(
+    mrconso: pathlib.Path | str,
+    index_path: pathlib.Path | str = DEFAULT_INDEX_PATH,
+) -> pathlib.Path:
+    """
+    Construit l'index à partir de `mrconso` (écriture dans un fichier
+    temporaire puis rename atomique).  Retourne le chemin de l'index.
+    """
+    mrconso = pathlib.Path(mrconso)
+    index_path = pathlib.Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+
+    mesh_cui: dict[str, list[str]] = {}
+    cui_icd: dict[str, set[str]] = {}
+    with mrconso.open(encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("|")
+            sab = fields[_SAB]
+            if sab == "MSH":
+                cuis = mesh_cui.setdefault(fields[_CODE], [])
+                if fields[_CUI] not in cuis:          # ordre d'apparition conservé
+                    cuis.append(fields[_CUI])
+            elif sab == "ICD10CM" and fields[_SUPPRESS] == "N":
+                cui_icd.setdefault(fields[_CUI], set()).add(fields[_CODE])
+
+    conn = sqlite3.connect(str(tmp))
+    with conn:
+        conn.execute("CREATE TABLE mesh_cui (ui TEXT, rank INTEGER, cui TEXT)")
+        conn.execute("CREATE TABLE cui_icd (cui TEXT, code TEXT)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany(
+            "INSERT INTO mesh_cui VALUES (?, ?, ?)",
+            ((ui, rank, cui) for ui, cuis in mesh_cui.items()
+             for rank, cui in enumerate(cuis)),
+        )
+        conn.executemany(
+            "INSERT INTO cui_icd VALUES (?, ?)",
+            ((cui, code) for cui, codes in cui_icd.items() for code in codes),
+        )
+        conn.execute("CREATE INDEX idx_mesh_cui ON mesh_cui (ui, rank)")
+        conn.execute("CREATE INDEX idx_cui_icd ON cui_icd (cui)")
+        conn.execute(
+            "INSERT INTO meta VALUES ('source', ?)", (_source_signature(mrconso),)
+        )
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, index_path)
+    print(f"Index UMLS hors-ligne : {len(mesh_cui)} UI MeSH, "
+          f"{len(cui_icd)} CUI ICD-10-CM → {index_path}")
+    return index_path
+
+
+class OfflineUMLSResolver:
+    """
+    Résolveur MeSH → CUI → ICD-10-CM sans appel réseau.
+
+    Parameters
+    ----------
+    index_path : Path or str
+        Index construit par `build_mrconso_index`.
+    mrconso : Path or str, optional
+        MRCONSO.RRF source : l'index est (re)construit s'il est absent ou
+        s'il a été produit à partir d'une autre version de ce fichier.
+    """
+
+    def __init__(
+        self,
+        index_path: pathlib.Path | str = DEFAULT_INDEX_PATH,
+        mrconso: pathlib.Path | str | None = None,
+    ):
+        self._index_path = pathlib.Path(index_path)
+        if mrconso is not None and not self._is_up_to_date(pathlib.Path(mrconso)):
+            build_mrconso_index(mrconso, self._index_path)
+        if not self._index_path.is_file():
+            raise FileNotFoundError(
+                f"Index UMLS hors-ligne introuvable : {self._index_path} "
+                "(fournir le MRCONSO.RRF source)"
+            )
+        # identité du MRCONSO indexé : espace de noms du cache ICD-10
+        self.source_key = _source_key(self._source() or str(self._index_path))
+        # une connexion lecture seule par thread (prefetch multi-threadé)
+        self._local = threading.local()
+
+    def _source(self) -> str | None:
+        """Signature du MRCONSO.RRF dont l'index est issu."""
+        conn = sqlite3.connect(f"file:{self._index_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _is_up_to_date(self, mrconso: pathlib.Path) -> bool:
+        return self._index_path.is_file() and self._source() == _source_signature(mrconso)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self._index_path}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+            self._local.conn = conn
+        return conn
+
+    def mesh_ui_to_cuis(self, ui: str) -> list[str]:
+        """UI MeSH → liste (éventuelle) de CUI (souvent une seule)."""
+        rows = self._conn.execute(
+            "SELECT cui FROM mesh_cui WHERE ui = ? ORDER BY rank", (ui,)
+        ).fetchall()
+        return [cui for (cui,) in rows]
+
+    def cui_to_icd10cm(self, cui: str) -> list[str]:
+        rows = self._conn.execute(
+            "SELECT code FROM cui_icd WHERE cui = ?", (cui,)
+        ).fetchall()
+        return sorted({code for (code,) in rows})
+
+
+__all__ = [
+    "DEFAULT_INDEX_PATH",
+    "OfflineUMLSResolver",
+    "build_mrconso_index",
+    "mrconso_source_key",
+]
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# create_database/src/publish.py
+# ──────────────────────────────────────────────────────────────
+"""Publication incrémentale du dataset, shard par shard.
+
+Le dataset est réparti en `num_buckets` shards Parquet selon
+sha256(article_id) ; dans un shard, les lignes sont triées par
+`article_id`.  Un document modifié ne change donc que son shard, et un
+shard identique produit exactement les mêmes octets.  Chaque fichier est
+nommé d'après son contenu :
+
+    data/train-<bucket>-<sha256[:16]>.parquet
+    manifest.json        {bucket: {"path", "sha256", "num_rows"}}
+
+Publication : seuls les shards absents de la cible sont envoyés, puis le
+manifeste est remplacé (point de validation) et les anciens shards
+supprimés.  Une publication interrompue reprend là où elle s'était
+arrêtée (les fichiers déjà présents ne sont pas renvoyés).
+
+Deux cibles : `LocalTarget` (dossier, pour les tests) et `HubTarget`
+(dépôt dataset Hugging Face).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_STAGING_DIR = pathlib.Path("create_database/data/publish_staging")
+MANIFEST = "manifest.json"
+_DATA_DIR = "data"
+
+
+def _bucket(article_id, num_buckets: int) -> int:
+    digest = hashlib.sha256(str(article_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_buckets
+
+
+# --------------------------------------------------------------------------- #
+# 1) shards locaux                                                            #
+# --------------------------------------------------------------------------- #
+def write_shards(ds, staging_dir: pathlib.Path | str = DEFAULT_STAGING_DIR,
+                 num_buckets: int = 64) -> dict:
+    """
+    Écrit les shards Parquet de `ds` dans `staging_dir` (un fichier déjà
+    présent avec le même contenu n'est pas réécrit).  Retourne le manifeste.
+    """
+    staging_dir = pathlib.Path(staging_dir)
+    (staging_dir / _DATA_DIR).mkdir(parents=True, exist_ok=True)
+
+    table: pa.Table = ds.flatten_indices().data.table
+    ids = ds["article_id"]
+    buckets: list[list[int]] = [[] for _ in range(num_buckets)]
+    for i in sorted(range(len(ids)), key=lambda i: str(ids[i])):
+        buckets[_bucket(ids[i], num_buckets)].append(i)
+
+    shards = {}
+    for b, rows in enumerate(buckets):
+        if not rows:
+            continue
+        buf = io.BytesIO()
+        pq.write_table(table.take(pa.array(rows, type=pa.int64())), buf,
+                       compression="zstd", write_statistics=False)
+        data = buf.getvalue()
+        sha = hashlib.sha256(data).hexdigest()
+        path = f"{_DATA_DIR}/train-{b:05d}-{sha[:16]}.parquet"
+        local = staging_dir / path
+        if not local.is_file():
+            tmp = local.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, local)
+        shards[f"{b:05d}"] = {"path": path, "sha256": sha, "num_rows": len(rows)}
+
+    return {"num_buckets": num_buckets, "num_rows": len(ids), "shards": shards}
+
+
+class ParquetShardWriter:
+    """
+    Écriture incrémentale de shards Parquet typés (`train-00000.parquet`, …)
+    à partir de lots de lignes (mode `--streaming`) : au plus `rows_per_shard`
+    lignes en mémoire, chaque shard écrit de façon atomique.
+    """
+
+    def __init__(self, out_dir: pathlib.Path | str, schema: pa.Schema,
+                 rows_per_shard: int = 10_000):
+        self.out_dir = pathlib.Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        for old in self.out_dir.glob("train-*.parquet"):
+            old.unlink()                          # sortie d'un run précédent
+        self.schema = schema
+        self.rows_per_shard = rows_per_shard
+        self.num_rows = 0
+        self._tables: list[pa.Table] = []
+        self._buffered = 0
+        self._n_shards = 0
+
+    def write_batch(self, batch: dict[str, list]) -> None:
+        """Ajoute un lot {colonne: valeurs} (colonnes hors schéma ignorées)."""
+        table = pa.Table.from_pydict({name: batch[name] for name in self.schema.names},
+                                     schema=self.schema)
+        self._tables.append(table)
+        self._buffered += table.num_rows
+        self.num_rows += table.num_rows
+        if self._buffered >= self.rows_per_shard:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        path = self.out_dir / f"train-{self._n_shards:05d}.parquet"
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(pa.concat_tables(self._tables), tmp, compression="zstd")
+        os.replace(tmp, path)
+        self._n_shards += 1
+        self._tables, self._buffered = [], 0
+
+    def close(self) -> None:
+        self.flush()
+
+
+# --------------------------------------------------------------------------- #
+# 2) cibles                                                                   #
+# --------------------------------------------------------------------------- #
+class LocalTarget:
+    """Dossier local jouant le rôle du dépôt (tests, miroir)."""
+
+    def __init__(self, root: pathlib.Path | str):
+        self.root = pathlib.Path(root)
+
+    def read_manifest(self) -> dict | None:
+        path = self.root / MANIFEST
+        return json.loads(path.read_text(encoding="utf-8")) if path.is_file() else None
+
+    def list_files(self) -> set[str]:
+        if not self.root.is_dir():
+            return set()
+        return {p.relative_to(self.root).as_posix()
+                for p in self.root.rglob("*") if p.is_file()}
+
+    def upload(self, files: list[tuple[pathlib.Path, str]]) -> None:
+        for local, path in files:
+            dst = self.root / path
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_suffix(".tmp")
+            shutil.copyfile(local, tmp)
+            os.replace(tmp, dst)
+
+    def commit(self, manifest: dict, delete: list[str]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, self.root / MANIFEST)
+        for path in delete:
+            (self.root / path).unlink(missing_ok=True)
+
+
+class HubTarget:
+    """Dépôt dataset du Hub ; envois par commits de `files_per_commit` shards."""
+
+    def __init__(self, repo_id: str, token: str | None = None,
+                 files_per_commit: int = 8, private: bool = False):
+        from huggingface_hub import HfApi
+
+        self.repo_id = repo_id
+        self.files_per_commit = files_per_commit
+        self._api = HfApi(token=token)
+        self._api.create_repo(repo_id, repo_type="dataset", private=private, exist_ok=True)
+
+    def read_manifest(self) -> dict | None:
+        from huggingface_hub.utils import EntryNotFoundError
+
+        try:
+            path = self._api.hf_hub_download(self.repo_id, MANIFEST, repo_type="dataset")
+        except EntryNotFoundError:
+            return None
+        return json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+
+    def list_files(self) -> set[str]:
+        return set(self._api.list_repo_files(self.repo_id, repo_type="dataset"))
+
+    def upload(self, files: list[tuple[pathlib.Path, str]]) -> None:
+        from huggingface_hub import CommitOperationAdd
+
+        for i in range(0, len(files), self.files_per_commit):
+            chunk = files[i:i + self.files_per_commit]
+            self._api.create_commit(
+                self.repo_id,
+                repo_type="dataset",
+                operations=[CommitOperationAdd(path_in_repo=path, path_or_fileobj=str(local))
+                            for local, path in chunk],
+                commit_message=f"shards {i + 1}-{i + len(chunk)} / {len(files)}",
+            )
+
+    def commit(self, manifest: dict, delete: list[str]) -> None:
+        from huggingface_hub import CommitOperationAdd, CommitOperationDelete
+
+        ops = [CommitOperationAdd(path_in_repo=MANIFEST,
+                                  path_or_fileobj=json.dumps(manifest, indent=2).encode())]
+        ops += [CommitOperationDelete(path_in_repo=path) for path in delete]
+        self._api.create_commit(
+            self.repo_id, repo_type="dataset", operations=ops,
+            commit_message="GLiNER + MeSH + ICD-10-CM + trace (incrémental)",
+        )
+
+
+# --------------------------------------------------------------------------- #
+# 3) publication                                                              #
+# --------------------------------------------------------------------------- #
+def publish(ds, target, staging_dir: pathlib.Path | str = DEFAULT_STAGING_DIR,
+            num_buckets: int = 64) -> dict[str, int]:
+    """
+    Publie `ds` sur `target` en n'envoyant que les shards modifiés.
+
+    Returns
+    -------
+    dict
+        {"uploaded": …, "unchanged": …, "deleted": …}
+    """
+    staging_dir = pathlib.Path(staging_dir)
+    manifest = write_shards(ds, staging_dir, num_buckets)
+    previous = target.read_manifest() or {"shards": {}}
+    present = target.list_files()
+
+    wanted = {s["path"] for s in manifest["shards"].values()}
+    to_upload = sorted(wanted - present)          # déjà envoyés : reprise
+    target.upload([(staging_dir / path, path) for path in to_upload])
+
+    stale = sorted(
+        {s["path"] for s in previous["shards"].values()}
+        | {p for p in present if p.startswith(f"{_DATA_DIR}/train-")}
+    )
+    stale = [p for p in stale if p not in wanted]
+    if to_upload or stale or previous.get("shards") != manifest["shards"]:
+        target.commit(manifest, stale)
+
+    # shards locaux périmés : inutiles pour les prochaines publications
+    for local in (staging_dir / _DATA_DIR).glob("train-*.parquet"):
+        if f"{_DATA_DIR}/{local.name}" not in wanted:
+            local.unlink()
+
+    return {"uploaded": len(to_upload),
+            "unchanged": len(wanted) - len(to_upload),
+            "deleted": len(stale)}
+
+
+__all__ = [
+    "DEFAULT_STAGING_DIR",
+    "HubTarget",
+    "LocalTarget",
+    "ParquetShardWriter",
+    "publish",
+    "write_shards",
+]
@@ -1,26 +1,255 @@
-import os, time, requests, xml.etree.ElementTree as ET, json, pathlib
+import os, time, requests, xml.etree.ElementTree as ET, json, pathlib, fcntl, threading
+from urllib3.exceptions import HTTPError as _StreamError
+
+from ..http_client import get_client
+from ..metrics import get_metrics
 
 _API = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
 _KEY = os.getenv("NCBI_API_KEY")
 _CACHE = pathlib.Path("create_database/data/dictionnaires/cache_pubmed.json")
-try:
-    mapping = json.loads(_CACHE.read_text()) if _CACHE.exists() else {}
-except json.JSONDecodeError:
-    # fichier vide ou corrompu → on repart d’un cache vide
-    mapping = {}
+_BATCH = 200                              # nb max de PMIDs par appel EFetch
+_RETRIES = 3                              # lectures interrompues (retries HTTP : client)
+
+
+class PubMedMeshCache:
+    """
+    Cache {pmid: [mesh_id, ...]} partagé entre processus.
+
+    • instantané compacté : `cache_pubmed.json` (écrit par rename atomique) ;
+    • journal append-only : `cache_pubmed.log.jsonl`, une ligne JSON par
+      lot récupéré ; une ligne tronquée (crash) est ignorée au rechargement ;
+    • chargement paresseux au premier accès, relecture de la fin du journal
+      sur un défaut de cache (entrées ajoutées par d'autres workers) ;
+    • compaction (journal → instantané) tous les `compact_every` ajouts.
+
+    Écritures et compaction se font sous un verrou `fcntl` sur
+    `cache_pubmed.lock` ; un verrou interne protège l'état en mémoire
+    (étages réseau multi-threadés).
+    """
+
+    def __init__(self, path: pathlib.Path | str = _CACHE, compact_every: int = 500):
+        self.path = pathlib.Path(path)
+        self.log_path = self.path.with_suffix(".log.jsonl")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.compact_every = compact_every
+        self._data: dict[str, list[str]] | None = None
+        self._log_id = None            # (st_dev, st_ino) du journal lu
+        self._log_offset = 0
+        self._log_lines = 0
+        self._lock = threading.RLock()
+
+    # ---------------- verrou inter-processus ----------------
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock = self.lock_path.open("a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock                    # libéré à la fermeture du fichier
+
+    # ---------------- lecture ----------------
+    def _load_snapshot(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except json.JSONDecodeError:
+            # ne devrait plus arriver (écriture atomique) : on garde le
+            # fichier pour inspection plutôt que de l'écraser en silence
+            broken = self.path.with_suffix(f".corrupt-{int(time.time())}")
+            self.path.rename(broken)
+            print(f"cache PubMed illisible, déplacé vers {broken}")
+            return {}
+
+    def _read_log(self) -> None:
+        """Rejoue les lignes du journal ajoutées depuis la dernière lecture."""
+        try:
+            st = self.log_path.stat()
+        except FileNotFoundError:
+            return
+        if self._log_id != (st.st_dev, st.st_ino):
+            # journal remplacé par une compaction : instantané à relire
+            self._data = self._load_snapshot()
+            self._log_id, self._log_offset, self._log_lines = (st.st_dev, st.st_ino), 0, 0
+        with self.log_path.open("rb") as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break              # ligne en cours d'écriture / tronquée
+                self._log_offset += len(line)
+                try:
+                    self._data.update(json.loads(line))
+                    self._log_lines += 1
+                except json.JSONDecodeError:
+                    print("cache PubMed : ligne de journal illisible ignorée")
+
+    def _ensure_loaded(self) -> dict:
+        if self._data is None:
+            self._data = self._load_snapshot()
+            self._read_log()
+        return self._data
+
+    def get(self, pmid, default=None):
+        with self._lock:
+            data = self._ensure_loaded()
+            if pmid not in data:
+                self._read_log()
+            return self._data.get(pmid, default)
+
+    def __contains__(self, pmid) -> bool:
+        return self.get(pmid) is not None
+
+    def keys(self):
+        with self._lock:
+            self._ensure_loaded()
+            self._read_log()
+            return set(self._data)
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    # ---------------- écriture ----------------
+    def update(self, res: dict) -> None:
+        """Ajoute `res` au journal (une ligne, sous verrou) puis en mémoire."""
+        if not res:
+            return
+        with self._lock, self._locked():
+            self._ensure_loaded()
+            self._read_log()
+            with self.log_path.open("ab+") as f:
+                if f.tell():               # ligne tronquée laissée par un crash
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(json.dumps(res).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._read_log()
+            if self._log_lines >= self.compact_every:
+                self._compact()
+
+    def compact(self) -> None:
+        """Réécrit l'instantané complet et repart d'un journal vide."""
+        with self._lock, self._locked():
+            self._ensure_loaded()
+            self._read_log()
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._data))
+        os.replace(tmp, self.path)
+        empty = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+        empty.write_bytes(b"")
+        os.replace(empty, self.log_path)
+        st = self.log_path.stat()
+        self._log_id, self._log_offset, self._log_lines = (st.st_dev, st.st_ino), 0, 0
+
+
+mapping = PubMedMeshCache(_CACHE)
+
+
+def iter_mesh_headings(stream):
+    """
+    Parcourt en flux une réponse EFetch XML (objet fichier) et produit des
+    couples (pmid, [mesh_id, ...]) — un par `PubmedArticle`.
+
+    Seuls `MedlineCitation/PMID` et `DescriptorName/@UI` sont lus ; chaque
+    article est vidé dès qu'il a été traité, la mémoire reste donc constante
+    quelle que soit la taille du lot (résumés compris).
+    """
+    root, path, pmid, mesh = None, [], None, []
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            path.append(elem.tag)
+            continue
+        path.pop()
+        tag = elem.tag
+        if tag == "PMID" and pmid is None and path and path[-1] == "MedlineCitation":
+            pmid = (elem.text or "").strip()
+        elif tag == "DescriptorName" and path and path[-1] == "MeshHeading":
+            mesh.append(elem.get("UI"))
+        elif tag == "PubmedArticle":
+            if pmid:
+                yield pmid, mesh
+            pmid, mesh = None, []
+            root.clear()                  # libère l'article (et ses frères déjà lus)
+
 
 def fetch_batch(pmids):
+    """
+    Un appel EFetch pour `pmids` (≤ 200) : {pmid: [mesh_id, ...]}.
+    Les PMID non renvoyés par eUtils (embargo, rétractation…) sont mis en
+    cache avec une liste vide pour ne pas être redemandés.  En cas d'échec
+    réseau persistant, rien n'est mis en cache et {} est renvoyé.
+    """
     ids = ",".join(pmids)
     url = f"{_API}?db=pubmed&id={ids}&retmode=xml"
     if _KEY: url += f"&api_key={_KEY}"
-    xml = requests.get(url, timeout=15).text
-    root = ET.fromstring(xml)
-    res = {}
-    for art in root.findall(".//PubmedArticle"):
-        pmid = art.findtext(".//PMID").strip()
-        res[pmid] = [
-            d.get("UI") for d in art.findall(".//MeshHeading/DescriptorName")
-            if d is not None
-        ]
-    mapping.update(res); _CACHE.write_text(json.dumps(mapping))
+
+    # débit NCBI (3 ou 10 req/s), 429 / 5xx et Retry-After : client partagé
+    res = None
+    metrics = get_metrics()
+    for attempt in range(_RETRIES):       # réponse coupée en cours de lecture
+        if attempt:
+            metrics.inc("pubmed_efetch_retries_total")
+        try:
+            with metrics.timer("pubmed_efetch_seconds"), \
+                    get_client().get(url, timeout=15, stream=True) as resp:
+                if resp.status_code != 200:
+                    break
+                resp.raw.decode_content = True    # gzip éventuel
+                res = dict(iter_mesh_headings(resp.raw))
+                break
+        except (requests.RequestException, _StreamError, ET.ParseError):
+            pass
+    if res is None:
+        print(f"eUtils : échec pour {len(pmids)} PMID, cache inchangé")
+        return {}
+
+    for pmid in pmids:
+        res.setdefault(pmid, [])
+    mapping.update(res)                   # journal append-only, pas de réécriture
     return res
+
+
+# PMID en cours de récupération par un thread ➜ événement levé à la fin
+# (étages d'enrichissement concurrents, cf. `pipeline.streaming`)
+_inflight: dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+def prefetch(pmids, batch_size=_BATCH):
+    """
+    Récupère en amont tous les `pmids` absents du cache, par lots EFetch de
+    `batch_size` (débit NCBI respecté par le client HTTP partagé).  Un PMID
+    déjà demandé par un autre thread n'est pas redemandé : on attend sa
+    réponse (et on le redemande seulement si elle a échoué).
+    Retourne le nb de PMID demandés.
+    """
+    wanted = {str(p).strip() for p in pmids if str(p).strip()}
+    done = threading.Event()
+    with _inflight_lock:
+        absent = wanted - mapping.keys()
+        waiting = {pmid: _inflight[pmid] for pmid in absent if pmid in _inflight}
+        missing = sorted(absent - waiting.keys())
+        for pmid in missing:
+            _inflight[pmid] = done
+    metrics = get_metrics()
+    metrics.inc("cache_lookups_total", len(wanted) - len(missing), cache="pubmed", result="hit")
+    metrics.inc("cache_lookups_total", len(missing), cache="pubmed", result="miss")
+    try:
+        for i in range(0, len(missing), batch_size):
+            fetch_batch(missing[i:i + batch_size])
+    finally:
+        with _inflight_lock:
+            for pmid in missing:
+                _inflight.pop(pmid, None)
+        done.set()
+
+    for event in set(waiting.values()):
+        event.wait()
+    retry = sorted(pmid for pmid in waiting if pmid not in mapping)
+    for i in range(0, len(retry), batch_size):
+        fetch_batch(retry[i:i + batch_size])
+    return len(missing) + len(retry)
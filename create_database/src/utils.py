@@ -2,13 +2,28 @@
 # ------------------------------------------------
 """
 Utilitaires partagés :
-    • chargement du dictionnaire MeSH JSON
+    • chargement du dictionnaire MeSH (binaire mmap, ou JSON)
     • fabrication d’un SimstringMatcher prêt à l’emploi
+      (index Simstring persistant, reconstruit seulement si nécessaire)
+    • index exact « terme normalisé → MeSH » (voie rapide du normaliseur)
 """
 
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
 from pathlib import Path
+import hashlib
 import json
-from medkit.text.ner import SimstringMatcher, SimstringMatcherRule
+import shutil
+import struct
+import tempfile
+from anyascii import anyascii
+from medkit.text.ner import SimstringMatcherRule
+from medkit.text.ner._base_simstring_matcher import (
+    BaseSimstringMatcher,
+    build_simstring_matcher_databases,
+)
+
+from .mesh_dict_bin import MeshDict, write_mesh_dict_bin
 
 
 # chemin par défaut : create_database/data/mesh_dict.json
@@ -16,10 +31,35 @@ _DEFAULT_MESH_DICT = (
     Path(__file__).resolve().parents[2] / "create_database" / "data" / "dictionnaires" / "mesh_dict.json"
 )
 
+# index Simstring persistants : un sous-dossier par clé (cf. simstring_index_key)
+_DEFAULT_INDEX_DIR = (
+    Path(__file__).resolve().parents[2] / "create_database" / "data" / "simstring_index"
+)
+_SIMSTRING_DB = "simstring"
+_RULES_DB = "rules"
+_READY_FLAG = "READY"
+
+
+@lru_cache(maxsize=8)
+def _open_mesh_dict_bin(path: Path, size: int, mtime_ns: int) -> MeshDict | None:
+    """Vue mmap partagée par tous les appels du processus (None si périmée)."""
+    try:
+        mesh = MeshDict(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    return mesh if (mesh.source_size, mesh.source_mtime_ns) == (size, mtime_ns) else None
 
-def load_mesh_dict(path: str | Path = _DEFAULT_MESH_DICT) -> list[dict]:
+
+def load_mesh_dict(path: str | Path = _DEFAULT_MESH_DICT) -> Sequence[dict]:
     """
-    Charge le JSON contenant les couples {term, id}.
+    Charge le dictionnaire des couples {term, id}.
+
+    Le format binaire `mesh_dict.bin` (cf. `mesh_dict_bin`), à côté du
+    JSON, est projeté en mémoire : une seule copie dans le cache de pages
+    de l'OS pour tous les processus.  S'il est absent ou ne correspond plus
+    au JSON (taille et date enregistrées dans son en-tête, un simple
+    `stat`), le JSON est lu et le binaire régénéré pour les chargements
+    suivants.
 
     Parameters
     ----------
@@ -28,38 +68,89 @@ def load_mesh_dict(path: str | Path = _DEFAULT_MESH_DICT) -> list[dict]:
 
     Returns
     -------
-    list[dict]
-        Liste des entrées valides.
+    Sequence[dict]
+        Entrées {term, id}, dans l'ordre du fichier (`MeshDict` ou liste).
     """
-    with Path(path).expanduser().open(encoding="utf-8") as f:
-        return json.load(f)
+    path = Path(path).expanduser().resolve()
+    st = path.stat()
+    binary = path.with_suffix(".bin")
 
+    mesh = _open_mesh_dict_bin(binary, st.st_size, st.st_mtime_ns)
+    if mesh is not None:
+        return mesh
 
-def load_simstring_matcher(
+    with path.open(encoding="utf-8") as f:
+        entries = json.load(f)
+    try:
+        write_mesh_dict_bin(entries, binary, path, fold_term)
+        _open_mesh_dict_bin.cache_clear()
+    except OSError as exc:           # dossier en lecture seule : JSON seul
+        print(f"mesh_dict.bin non écrit ({exc})")
+    return entries
+
+
+def fold_term(text: str) -> str:
+    """
+    Forme normalisée d'un terme : minuscules + translittération ASCII
+    (accents supprimés).  C'est exactement la transformation appliquée par
+    le SimstringMatcher aux termes et aux candidats.
+    """
+    return anyascii(text.lower())
+
+
+def load_mesh_exact_index(path: str | Path = _DEFAULT_MESH_DICT) -> Mapping[str, str]:
+    """
+    Index « terme normalisé → MeSH ID ».
+
+    Pour un terme présent sous plusieurs ID, on garde le premier dans
+    l'ordre du fichier : c'est la rule que retient le SimstringMatcher.
+    Lu dans `mesh_dict.bin` (recherche dichotomique sur la projection,
+    aucune copie par processus) ; dict construit depuis le JSON seulement
+    si le binaire n'a pas pu être écrit.
+    """
+    entries = load_mesh_dict(path)
+    if isinstance(entries, MeshDict):
+        return entries.exact_index()
+    index: dict[str, str] = {}
+    for entry in entries:
+        term, mesh_id = entry.get("term"), entry.get("id")
+        if term and mesh_id:
+            index.setdefault(fold_term(term), mesh_id)
+    return index
+
+
+def simstring_index_key(
     path: str | Path = _DEFAULT_MESH_DICT,
     threshold: float = 0.85,
     similarity: str = "jaccard",
-) -> SimstringMatcher:
+) -> str:
     """
-    Construit un SimstringMatcher alimenté par le dictionnaire MeSH.
+    Clé d'un index Simstring : hash du contenu du dictionnaire, du seuil
+    et de la mesure de similarité.  Toute modification de l'un d'eux
+    produit une nouvelle clé, donc un nouvel index.
+    """
+    path = Path(path).expanduser()
+    st = path.stat()
+    return _simstring_index_key(path, st.st_size, st.st_mtime_ns, threshold, similarity)
 
-    Parameters
-    ----------
-    path : str or Path, optional
-        Fichier JSON {term, id}.  Défaut : _DEFAULT_MESH_DICT
-    threshold : float
-        Seuil de similarité (Simstring). 0.85 recommandé pour Jaccard.
-    similarity : str
-        'jaccard' ou 'cosine'.
 
-    Returns
-    -------
-    SimstringMatcher
-        Matcher prêt à être utilisé par l’opération MeshNormalizer.
-    """
+@lru_cache(maxsize=8)
+def _simstring_index_key(path: Path, size: int, mtime_ns: int,
+                         threshold: float, similarity: str) -> str:
+    """Hash calculé une fois par version du fichier (taille, date)."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(f"|{threshold}|{similarity}".encode())
+    return h.hexdigest()[:16]
+
+
+def _build_mesh_rules(path: str | Path) -> list[SimstringMatcherRule]:
+    """Une `SimstringMatcherRule` par entrée {term, id} valide."""
     mesh_dict = load_mesh_dict(path)
 
-    rules = [
+    return [
         SimstringMatcherRule.from_dict(
             {
                 "term": entry["term"],
@@ -80,11 +171,92 @@ def load_simstring_matcher(
         if entry.get("term") and entry.get("id")
     ]
 
-    return SimstringMatcher(
-        rules=rules,
+
+def build_simstring_index(
+    path: str | Path = _DEFAULT_MESH_DICT,
+    threshold: float = 0.85,
+    similarity: str = "jaccard",
+    index_dir: str | Path = _DEFAULT_INDEX_DIR,
+) -> Path:
+    """
+    Retourne le dossier de l'index Simstring (base n-grammes + table des
+    rules) correspondant aux paramètres ; le construit s'il n'existe pas.
+
+    La construction se fait dans un dossier temporaire renommé ensuite
+    atomiquement : plusieurs workers démarrant en même temps ne voient
+    jamais d'index partiel.
+    """
+    index_dir = Path(index_dir).expanduser()
+    target = index_dir / simstring_index_key(path, threshold, similarity)
+    if (target / _READY_FLAG).is_file():
+        return target
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=index_dir, prefix=".build-"))
+    try:
+        build_simstring_matcher_databases(
+            tmp / _SIMSTRING_DB,
+            tmp / _RULES_DB,
+            _build_mesh_rules(path),
+        )
+        (tmp / _READY_FLAG).write_text(str(Path(path).expanduser()), encoding="utf-8")
+        try:
+            tmp.rename(target)
+        except OSError:
+            # un autre processus a publié le même index entre-temps
+            if not (target / _READY_FLAG).is_file():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def load_simstring_matcher(
+    path: str | Path = _DEFAULT_MESH_DICT,
+    threshold: float = 0.85,
+    similarity: str = "jaccard",
+    index_dir: str | Path = _DEFAULT_INDEX_DIR,
+) -> BaseSimstringMatcher:
+    """
+    Construit un SimstringMatcher alimenté par le dictionnaire MeSH.
+
+    L'index (base Simstring + table des rules) est lu sur disque ; il n'est
+    reconstruit que si le dictionnaire, le seuil ou la mesure changent.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Fichier JSON {term, id}.  Défaut : _DEFAULT_MESH_DICT
+    threshold : float
+        Seuil de similarité (Simstring). 0.85 recommandé pour Jaccard.
+    similarity : str
+        'jaccard' ou 'cosine'.
+    index_dir : str or Path, optional
+        Dossier racine des index persistants.
+
+    Returns
+    -------
+    BaseSimstringMatcher
+        Matcher prêt à être utilisé par l’opération MeshNormalizer
+        (même comportement que `SimstringMatcher`, sans reconstruction).
+    """
+    index = build_simstring_index(path, threshold, similarity, index_dir)
+
+    # la base Simstring (cdb) et la table shelve sont ouvertes en lecture
+    # seule : les pages sont partagées via le cache disque de l'OS
+    return BaseSimstringMatcher(
+        simstring_db_file=index / _SIMSTRING_DB,
+        rules_db_file=index / _RULES_DB,
         threshold=threshold,
         similarity=similarity,
     )
 
 
-__all__ = ["load_mesh_dict", "load_simstring_matcher"]
+__all__ = [
+    "build_simstring_index",
+    "fold_term",
+    "load_mesh_dict",
+    "load_mesh_exact_index",
+    "load_simstring_matcher",
+    "simstring_index_key",
+]